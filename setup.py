@@ -12,6 +12,7 @@ REQUIREMENTS = [
 DEV_REQUIREMENTS = {
     "dev": [
         "pytest==7.2.*",
+        "pytest-benchmark==4.0.*",
         "pylint==2.16.*",
         "black==23.1.*",
         "mock==4.0.3",
@@ -1,15 +1,25 @@
 """ Entry point for cli """
+import json
 import logging
 import os
 import sys
+import time
 import argparse
 import warnings
 from workalendar.asia import Singapore
-from tp_timesheet import __version__
+from tp_timesheet import __version__, tracing
 from tp_timesheet.date_utils import get_working_dates, get_start_date, assert_start_date
 from tp_timesheet.schedule import ScheduleForm
 from tp_timesheet.config import Config
-from tp_timesheet.clockify_timesheet import Clockify
+from tp_timesheet.breaker import CircuitBreaker, CircuitOpenError
+from tp_timesheet.concurrency import AdaptiveConcurrencyLimiter
+from tp_timesheet.journal import Journal
+from tp_timesheet.jobqueue import JobQueue, work
+from tp_timesheet.history import RunHistory, RunLog, format_history
+from tp_timesheet.ledger import SubmissionLedger, user_key
+from tp_timesheet.notify import Notifier
+from tp_timesheet.prepare import PreparedRuns
+from tp_timesheet.ratelimit import SharedRateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +44,41 @@ def parse_args():
         type=str,
         help="Automate mode: Schedules the form submission to run automatically. Accepted arguments = [weekdays]",
     )
+    group.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="Resume mode: Continues the oldest interrupted run, only dates that were not submitted are processed",
+    )
+    group.add_argument(
+        "-w",
+        "--worker",
+        action="store_true",
+        help="Worker mode: Submits the jobs of the shared job queue (see --enqueue) until it is drained, "
+        + "several workers can share one queue",
+    )
+    group.add_argument(
+        "--serve",
+        type=int,
+        nargs="?",
+        const=8787,
+        metavar="PORT",
+        help="Serve mode: Accepts submissions from other tools on a local http api "
+        + "(default port 8787), submissions arriving together are batched. Requests need the "
+        + "token in serve.token of the config directory. See README",
+    )
+    group.add_argument(
+        "--history",
+        action="store_true",
+        help="History mode: Lists the latest runs (timings, dates, requests, errors) and daily "
+        + "aggregates, filter with --since, --failed, --throttled and --slower-than",
+    )
+    group.add_argument(
+        "--doctor",
+        action="store_true",
+        help="Doctor mode: Times every phase of a run (dns, connect, tls, api lookups, calendar, "
+        + "config) and reports the state of the local caches, to attach to support tickets",
+    )
     parser.add_argument(
         "-c",
         "--count",
@@ -42,11 +87,20 @@ def parse_args():
         default=1,
         help="Number of weekdays to submit a timesheet for, use '5' on a monday to submit for the entire week",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of dates to submit concurrently, each date is still replaced atomically",
+    )
     parser.add_argument(
         "-n",
         "--notification",
         action="store_true",
-        help="Notification feature, notification will be shown when the timesheet submission is done(for OSX only)",
+        help="Notification feature, notification will be shown when the timesheet submission is done \
+                (OSX notification center, notify-send on linux desktops, logged otherwise)",
     )
     parser.add_argument(
         "-v",
@@ -60,6 +114,114 @@ def parse_args():
         action="store_true",
         help="Dry run mode, runs through as per normal but will not submit",
     )
+    parser.add_argument(
+        "--skip-submitted",
+        action="store_true",
+        help="Skip dates that were already submitted with the same tasks, according to the local "
+        + "ledger. If every date was submitted the run exits without any network access",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="With --skip-submitted, only skip dates whose submitted entries still exist on clockify",
+    )
+    parser.add_argument(
+        "-p",
+        "--prepare",
+        action="store_true",
+        help="Prepare the time entries of the upcoming scheduled runs ahead of time, "
+        + "so the scheduled runs only have to send them",
+    )
+    parser.add_argument(
+        "-e",
+        "--enqueue",
+        action="store_true",
+        help="Adds the dates to the shared job queue instead of submitting them, to be submitted by --worker",
+    )
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Job queue file used by --enqueue and --worker, put it on a shared filesystem to "
+        + "use workers on several machines (default: queue.sqlite in the config directory)",
+    )
+    parser.add_argument(
+        "--simulate",
+        type=int,
+        metavar="TEAM_SIZE",
+        help="Simulation mode: runs the whole submission for the given number of users against an "
+        + "in-process fake api and reports request counts, concurrency and estimated wall time",
+    )
+    parser.add_argument(
+        "--simulate-latency",
+        type=float,
+        default=150,
+        metavar="MS",
+        help="Latency of every request to the fake api in simulation mode, in milliseconds",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="With --doctor or --history, print the report as json instead of a table",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="With --history, only runs from this date on (same formats as --start)",
+    )
+    parser.add_argument(
+        "--failed", action="store_true", help="With --history, only failed runs"
+    )
+    parser.add_argument(
+        "--throttled",
+        action="store_true",
+        help="With --history, only runs that were rate limited by the api (429 responses)",
+    )
+    parser.add_argument(
+        "--slower-than",
+        type=float,
+        metavar="SECONDS",
+        help="With --history, only runs that took longer than this",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="With --history, number of runs to list (default 20)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the whole run: writes cProfile stats, flamegraph-ready collapsed stacks and "
+        + "the top memory allocations to the profiles directory next to the logs",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        metavar="PATH",
+        help="Trace the spans of the run (config, calendar, clockify setup, every date and its "
+        + "api requests) to a Chrome trace event file, open it in ui.perfetto.dev",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        metavar="CASSETTE",
+        help="Record every request to the clockify api and its response to a cassette file "
+        + "(the api key is redacted), to be replayed with --replay",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        metavar="CASSETTE",
+        help="Serve the clockify api responses from a cassette recorded with --record, "
+        + "nothing is sent to the api",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        action="store_true",
+        help="With --replay, serve every response after its recorded latency",
+    )
     parser.add_argument(
         "--version", action="version", version=f"%(prog)s {__version__}"
     )
@@ -74,6 +236,10 @@ def parse_args():
         + 'Passing multiple task-hour pair is also acceptable. (E.g. "--task live 4 --task OOO 4" for afternoon OOO.)',
     )
     args = parser.parse_args()
+    if args.simulate is not None and args.start is None:
+        parser.error("--simulate requires --start")
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be used together")
 
     # postprocessing args
     logger.debug("Given task and hour pairs : %s", args.task)
@@ -87,16 +253,334 @@ def parse_args():
     return args
 
 
+def create_clockify(config, api_key, locale, metadata=None, args=None):
+    """Create a Clockify object with the http settings from the config
+
+    With --record or --replay in `args` the requests go through a recording or replaying
+    transport. A replayed run skips the rate limit, the http cache and the circuit breaker,
+    so it sends exactly the recorded requests. A recorded run skips the http cache, responses
+    served from it would never reach the cassette.
+    """
+    # Imported here, runs that never talk to the api don't pay for the http stack
+    # pylint: disable=import-outside-toplevel
+    from tp_timesheet.clockify_timesheet import Clockify
+    from tp_timesheet.http_cache import HTTPCache
+    from tp_timesheet.transport import RecordingTransport, ReplayTransport
+
+    recording = args is not None and args.record
+    if args is not None and args.replay:
+        return Clockify(
+            api_key,
+            locale=locale,
+            timeouts=config.HTTP_TIMEOUTS,
+            metadata=metadata,
+            session=ReplayTransport(args.replay, latency=args.replay_latency),
+        )
+    return Clockify(
+        api_key,
+        locale=locale,
+        timeouts=config.HTTP_TIMEOUTS,
+        hedge=config.HTTP_HEDGE,
+        session=RecordingTransport(args.record) if recording else None,
+        metadata=metadata,
+        rate_limiter=SharedRateLimiter(config.HTTP_RATE_LIMIT)
+        if config.HTTP_RATE_LIMIT > 0
+        else None,
+        http_cache=HTTPCache(config.HTTP_CACHE_TTL)
+        if config.HTTP_CACHE_TTL >= 0 and not recording
+        else None,
+        circuit_breaker=CircuitBreaker(
+            config.HTTP_BREAKER_FAILURES, config.HTTP_BREAKER_RESET
+        )
+        if config.HTTP_BREAKER_FAILURES > 0
+        else None,
+        concurrency_limiter=AdaptiveConcurrencyLimiter(
+            maximum=config.HTTP_MAX_CONCURRENCY
+        )
+        if config.HTTP_MAX_CONCURRENCY > 0
+        else None,
+    )
+
+
+def run_simulation(args, config):
+    """Simulation mode, runs the submission of a team against a fake api and logs a report"""
+    # pylint: disable=import-outside-toplevel
+    from tp_timesheet.simulate import simulate, format_report
+
+    warnings.filterwarnings(
+        "ignore", message="Please take note that, due to arbitrary decisions, "
+    )
+    report = simulate(
+        team_size=args.simulate,
+        start_date=get_start_date(args.start),
+        count=args.count,
+        task_and_hours=args.task,
+        cal=Singapore(),
+        workers=args.jobs,
+        locale=config.LOCALE,
+        latency=args.simulate_latency / 1000,
+    )
+    for line in format_report(report):
+        logger.info(line)
+
+
+def run_worker(args, config, run_log):
+    """Worker mode, submits jobs from the shared queue until it is drained"""
+
+    def clockify_factory(api_key, locale):
+        clockify = create_clockify(config, api_key, locale, args=args)
+        run_log.clockify_objects.append(clockify)
+        return clockify
+
+    job_queue = JobQueue(path=args.queue)
+    completed = work(
+        job_queue, clockify_factory, workers=args.jobs, ledger=SubmissionLedger()
+    )
+    logger.info(
+        "Job queue drained, %d job(s) completed by this worker. Queue: %s",
+        completed,
+        job_queue.counts(),
+    )
+
+
+def run_server(args, config, run_log):
+    """Serve mode, submits the requests of the local http api until interrupted"""
+    # pylint: disable=import-outside-toplevel
+    from tp_timesheet.clockify_timesheet import Clockify
+    from tp_timesheet.serve import Batcher, SubmissionServer, load_token
+
+    def clockify_factory(api_key, locale):
+        clockify = create_clockify(config, api_key, locale, args=args)
+        run_log.clockify_objects.append(clockify)
+        return clockify
+
+    warnings.filterwarnings(
+        "ignore", message="Please take note that, due to arbitrary decisions, "
+    )
+    batcher = Batcher(
+        clockify_factory,
+        workers=max(args.jobs, 4),
+        ledger=SubmissionLedger(),
+    )
+    # Authenticate the default user up front, so the first request is already warm
+    try:
+        batcher.clockify(config.CLOCKIFY_API_KEY, config.LOCALE).metadata
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Could not resolve the clockify metadata", exc_info=True)
+    server = SubmissionServer(
+        batcher,
+        config.CLOCKIFY_API_KEY,
+        config.LOCALE,
+        load_token(),
+        port=args.serve,
+        task_names=list(Clockify.task_project_dict),
+        sanity_check_range=config.SANITY_CHECK_RANGE
+        if config.SANITY_CHECK_START_DATE
+        else None,
+    )
+    logger.info("Serving on http://127.0.0.1:%d/submissions", server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopped serving")
+    finally:
+        server.server_close()
+
+
+def run_doctor(args, config, config_seconds):
+    """Doctor mode, prints a breakdown of where the time of a run goes"""
+    # pylint: disable=import-outside-toplevel
+    from tp_timesheet.doctor import diagnose, format_report
+
+    warnings.filterwarnings(
+        "ignore", message="Please take note that, due to arbitrary decisions, "
+    )
+    report = diagnose(
+        config,
+        create_clockify(config, config.CLOCKIFY_API_KEY, config.LOCALE, args=args),
+        config_seconds=config_seconds,
+        network=not args.replay,
+    )
+    print(
+        json.dumps(report, indent=2) if args.json else "\n".join(format_report(report))
+    )
+
+
+def run_history(args):
+    """History mode, prints the latest runs and daily aggregates matching the filters"""
+    filters = {
+        "since": None
+        if args.since is None
+        else time.mktime(get_start_date(args.since).timetuple()),
+        "status": "failed" if args.failed else None,
+        "slower_than": args.slower_than,
+        "throttled": args.throttled,
+    }
+    history = RunHistory()
+    runs, days = history.runs(limit=args.limit, **filters), history.daily(**filters)
+    if args.json:
+        print(json.dumps({"runs": runs, "days": days}, indent=2))
+    else:
+        print("\n".join(format_history(runs, days)))
+
+
+def mode_name(args):
+    """Name of the mode of a run, as stored in the run history"""
+    for mode in ("simulate", "worker", "serve", "doctor", "automate"):
+        if getattr(args, mode) not in (None, False):
+            return mode
+    if args.resume:
+        return "resume"
+    if args.enqueue:
+        return "enqueue"
+    return "dry-run" if args.dry_run else "submit"
+
+
+def record_run(run_log):
+    """Store a run in the run history, never fails the run"""
+    try:
+        RunHistory().record(run_log)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Could not record the run in the history", exc_info=True)
+
+
+def prepare_scheduled_runs(clockify, prepared, task_and_hours, count=5):
+    """Prepare the time entries of the next `count` scheduled runs, never fails the current run"""
+    try:
+        cal = Singapore()
+        submissions = []
+        scheduler = ScheduleForm(Config.SCHEDULE_WINDOW, user_key(clockify.api_key))
+        for run_date in scheduler.next_run_dates(count):
+            working_dates, holidays = get_working_dates(
+                start=run_date, count=1, cal=cal
+            )
+            submissions += [(date, task_and_hours) for date in working_dates]
+            submissions += [(date, {"holiday": 8}) for date in holidays]
+        prepared.prepare(clockify, submissions)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Could not prepare the upcoming scheduled runs", exc_info=True)
+
+
+def queue_offline(args, config, submissions):
+    """Queue submissions that could not be sent because the api is down
+
+    Only done when a job queue already exists, so a worker is known to pick them up later.
+
+    Returns:
+        True: when the submissions were queued
+    """
+    job_queue = JobQueue(path=args.queue)
+    if not os.path.exists(job_queue.path):
+        return False
+    job_queue.enqueue(
+        user_key(config.CLOCKIFY_API_KEY),
+        config.CLOCKIFY_API_KEY,
+        config.LOCALE,
+        submissions,
+    )
+    logger.warning(
+        "The clockify api is down, queued %d date(s) for `tp-timesheet --worker`",
+        len(submissions),
+    )
+    return True
+
+
+def skip_submitted(submissions, ledger, user, locale, verify_with=None):
+    """Drop the submissions the ledger records as already submitted with the same plan
+
+    Args:
+        verify_with (Clockify): when given, a date is only skipped if the recorded time entries
+            still exist on the server
+    """
+    remaining = []
+    for date, task_and_hours in submissions:
+        plan = ledger.plan_hash(task_and_hours, locale)
+        entry_ids = ledger.submitted(user, date, plan)
+        if entry_ids is not None and verify_with is not None:
+            if sorted(verify_with.get_time_entry_id(date)) != sorted(entry_ids):
+                logger.info("Entries on %s changed since they were submitted", date)
+                entry_ids = None
+        if entry_ids is None:
+            remaining.append((date, task_and_hours))
+        else:
+            logger.info("Timesheet for %s is already submitted, skipping", date)
+    return remaining
+
+
+def submitted_text(submissions, start=None):
+    """Notification text of the submitted (date, task_and_hours) pairs, holidays included
+
+    Args:
+        start (str): --start argument, shown instead of the date when a single date was submitted
+    """
+    dates = sorted(date for date, _ in submissions)
+    if not dates:
+        return "Every timesheet was already submitted."
+    if len(dates) == 1:
+        submitted = start.lower() if start else dates[0]
+        return f"Timesheet for {submitted} is successfully submitted."
+    return f"Timesheets from {dates[0]} to {dates[-1]} are successfully submitted."
+
+
 def run():
     """Entry point"""
-    # pylint: disable=too-many-statements
     args = parse_args()
+    if args.trace:
+        tracing.start()
+    try:
+        if not args.profile:
+            run_pipeline(args)
+            return
+        # pylint: disable=import-outside-toplevel
+        from tp_timesheet.profiling import Profiler
+
+        with Profiler(Config.LOG_DIR.joinpath("profiles")):
+            run_pipeline(args)
+    finally:
+        if args.trace:
+            tracing.stop(args.trace)
+
+
+def run_pipeline(args):
+    """Run the mode selected by the command line arguments"""
+    # pylint: disable=too-many-statements,too-many-branches,too-many-return-statements,too-many-locals
     notification_text = None
 
-    config = Config(verbose=args.verbose)
+    started = time.perf_counter()
+    with tracing.span("config"):
+        config = Config(verbose=args.verbose)
+    config_seconds = time.perf_counter() - started
+    run_log = RunLog(mode_name(args), user_key(config.CLOCKIFY_API_KEY))
+    notifier = Notifier(config.NOTIFICATION_BACKEND, config.NOTIFICATION_TIMEOUT)
 
     try:
-        clockify = Clockify(config.CLOCKIFY_API_KEY, locale=config.LOCALE)
+        # History Mode
+        if args.history:
+            run_history(args)
+            return
+
+        # Simulation Mode
+        if args.simulate is not None:
+            run_simulation(args, config)
+            return
+
+        # Worker Mode
+        if args.worker:
+            run_worker(args, config, run_log)
+            return
+
+        # Doctor Mode
+        if args.doctor:
+            run_doctor(args, config, config_seconds)
+            return
+
+        # Serve Mode
+        if args.serve is not None:
+            run_server(args, config, run_log)
+            return
+
+        # Time entries prepared by a previous run skip the metadata and id lookups
+        prepared = PreparedRuns(config.CLOCKIFY_API_KEY, config.LOCALE)
 
         # Automate Mode
         if args.automate is not None:
@@ -106,8 +590,16 @@ def run():
                     "'%s' is not a valid option for --automate mode", args.automate
                 )
                 return
-            scheduler = ScheduleForm()
+            scheduler = ScheduleForm(
+                config.SCHEDULE_WINDOW, user_key(config.CLOCKIFY_API_KEY)
+            )
             scheduler.schedule()
+            if args.prepare:
+                clockify = create_clockify(
+                    config, config.CLOCKIFY_API_KEY, config.LOCALE, args=args
+                )
+                run_log.clockify_objects.append(clockify)
+                prepare_scheduled_runs(clockify, prepared, args.task)
             return
 
         # Normal Mode
@@ -115,53 +607,145 @@ def run():
             warnings.filterwarnings(
                 "ignore", message="Please take note that, due to arbitrary decisions, "
             )
-        cal = Singapore()
-
-        start_date = get_start_date(args.start)
-        if not assert_start_date(start_date):
-            logger.critical("Start date failed sanity check. Aborting program")
-            sys.exit(1)
-        working_dates, holidays = get_working_dates(
-            start=start_date, count=args.count, cal=cal
-        )
+        journal = Journal()
 
-        logger.info(
-            "Try to submitting %d report(s)... (working days: %s / holidays : %s)",
-            args.count,
-            working_dates,
-            holidays,
-        )
+        # Resume Mode
+        if args.resume:
+            if not journal.load():
+                logger.error("There is no interrupted run to resume")
+                return
+            submissions = journal.pending()
+            logger.info(
+                "Resuming interrupted run, %d date(s) left to submit: %s",
+                len(submissions),
+                [date for date, _ in submissions],
+            )
+        else:
+            with tracing.span("calendar", start=args.start, count=args.count):
+                cal = Singapore()
 
-        for date in working_dates:
-            clockify.submit_clockify(date, args.task, dry_run=args.dry_run)
+                start_date = get_start_date(args.start)
+                if not assert_start_date(start_date):
+                    logger.critical("Start date failed sanity check. Aborting program")
+                    sys.exit(1)
+                working_dates, holidays = get_working_dates(
+                    start=start_date, count=args.count, cal=cal
+                )
 
-        for date in holidays:
-            clockify.submit_clockify(date, {"holiday": 8}, dry_run=args.dry_run)
+            logger.info(
+                "Try to submitting %d report(s)... (working days: %s / holidays : %s)",
+                args.count,
+                working_dates,
+                holidays,
+            )
+            submissions = [(date, args.task) for date in working_dates] + [
+                (date, {"holiday": 8}) for date in holidays
+            ]
+            if args.enqueue:
+                JobQueue(path=args.queue).enqueue(
+                    user_key(config.CLOCKIFY_API_KEY),
+                    config.CLOCKIFY_API_KEY,
+                    config.LOCALE,
+                    submissions,
+                )
+                logger.info(
+                    "Queued %d date(s), run `tp-timesheet --worker` to submit them",
+                    len(submissions),
+                )
+                return
 
-        # Notification (OSX only)
-        if args.notification and sys.platform.lower() == "darwin":
-            if len(working_dates) == 1:
-                notification_text = (
-                    f"Timesheet for {args.start.lower()} is successfully submitted."
+        user = user_key(config.CLOCKIFY_API_KEY)
+        ledger = SubmissionLedger()
+        clockify = None
+        if args.skip_submitted:
+            if args.verify:
+                clockify = create_clockify(
+                    config, config.CLOCKIFY_API_KEY, config.LOCALE, args=args
                 )
-            else:
-                date_0 = working_dates[0]
-                date_f = working_dates[-1]
-                notification_text = (
-                    f"Timesheets from {date_0} to {date_f} are successfully submitted."
+                run_log.clockify_objects.append(clockify)
+            submissions = skip_submitted(
+                submissions, ledger, user, config.LOCALE, verify_with=clockify
+            )
+            if not submissions:
+                logger.info("Every date is already submitted, nothing to do")
+                return
+
+        if clockify is None:
+            with tracing.span("clockify init"):
+                # A recorded run does its own lookups, so a replay does not need prepared data
+                use_prepared = not args.record and prepared.load()
+                clockify = create_clockify(
+                    config,
+                    config.CLOCKIFY_API_KEY,
+                    config.LOCALE,
+                    metadata=prepared.metadata if use_prepared else None,
+                    args=args,
                 )
+                run_log.clockify_objects.append(clockify)
+                if use_prepared:
+                    prepared.apply(clockify)
+
+        # Dry runs and replays submit nothing, they must not touch the journal or the ledger
+        keep_records = not args.dry_run and not args.replay
+        # Unknown tasks, projects or tags fail here, before anything is written
+        try:
+            with tracing.span("plan", dates=len(submissions)):
+                planned = clockify.plan(submissions)
+        except CircuitOpenError:
+            if not keep_records or not queue_offline(args, config, submissions):
+                raise
+            # The journal of an earlier interrupted run is kept unless this run resumed it
+            if args.resume:
+                journal.finish()
+            return
+        if not args.resume and keep_records:
+            journal.begin(submissions)
+
+        def on_submitted(date, task_and_hours, entry_ids):
+            run_log.dates.append(date)
+            journal.mark_done(date)
+            plan = ledger.plan_hash(task_and_hours, config.LOCALE)
+            ledger.record(user, date, plan, entry_ids)
+
+        try:
+            clockify.submit_all(
+                submissions,
+                dry_run=args.dry_run,
+                workers=args.jobs,
+                on_submitted=on_submitted if keep_records else None,
+                planned=planned,
+            )
+        except CircuitOpenError:
+            if not keep_records or not queue_offline(args, config, journal.pending()):
+                raise
+            journal.finish()
+            return
+        if keep_records:
+            journal.finish()
+
+        # Notification, shown without waiting for it
+        if args.notification:
+            notification_text = submitted_text(
+                submissions, None if args.resume else args.start
+            )
             if args.dry_run:
                 notification_text = f"[DRY_RUN] {notification_text}"
-            os.system(
-                f"""osascript -e 'display notification "{notification_text}" with title "TP Timesheet"'"""
-            )
-    except Exception:  # pylint: disable=broad-except
+            notifier.notify(notification_text)
+
+        if args.prepare:
+            prepare_scheduled_runs(clockify, prepared, args.task)
+    except Exception as error:  # pylint: disable=broad-except
+        run_log.error = error
         notification_text = "⚠️ TP Timesheet was not submitted successfully."
         logger.critical(notification_text, exc_info=True)
-        os.system(
-            f"""osascript -e 'display dialog "{notification_text}" with title "TP Timesheet" buttons "OK" \
-                    default button "OK" with icon 2'"""
-        )
+        notifier.notify(notification_text, urgent=True)
+    except BaseException as error:
+        # Aborted by the sanity check or interrupted, still a failed run in the history
+        run_log.error = error
+        raise
+    finally:
+        if not args.history:
+            record_run(run_log)
 
 
 if __name__ == "__main__":
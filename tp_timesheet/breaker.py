@@ -0,0 +1,97 @@
+""" Circuit breaker shared by every tp-timesheet process, fails fast while the api is down """
+import logging
+import time
+from tp_timesheet.config import Config
+from tp_timesheet.store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the api is known to be failing"""
+
+
+class CircuitBreaker(SQLiteStore):
+    """Circuit breaker whose state is kept in a SQLite file
+
+    closed: requests are sent, consecutive failures are counted.
+    open: after `failures` consecutive failures, requests fail fast for `reset` seconds.
+    half_open: once `reset` seconds have passed a single probe request is let through, its
+        success closes the breaker and its failure opens it again. Other callers keep failing
+        fast while the probe is in flight.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS breakers (
+            name TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            failures INTEGER NOT NULL,
+            changed REAL NOT NULL
+        );
+    """
+
+    def __init__(self, failures=5, reset=30, name="clockify", path=None):
+        super().__init__(path or Config.CONFIG_DIR.joinpath("breaker.sqlite"))
+        self.failures = failures
+        self.reset = reset
+        self.name = name
+
+    def _read(self, connection):
+        """(state, failures, changed) of the breaker"""
+        row = connection.execute(
+            "SELECT state, failures, changed FROM breakers WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        return row or ("closed", 0, 0.0)
+
+    def _write(self, connection, state, failures):
+        connection.execute(
+            "INSERT OR REPLACE INTO breakers VALUES (?, ?, ?, ?)",
+            (self.name, state, failures, time.time()),
+        )
+
+    @property
+    def state(self):
+        """Current state, one of closed, open and half_open"""
+        return self._read(self.connection)[0]
+
+    def before_request(self):
+        """Check a request may be sent, raises `CircuitOpenError` when it may not"""
+        with self.transaction() as connection:
+            state, failures, changed = self._read(connection)
+            if state == "closed":
+                return
+            retry_in = changed + self.reset - time.time()
+            if retry_in > 0:
+                raise CircuitOpenError(
+                    f"The clockify api is failing, retrying in {retry_in:.0f}s"
+                )
+            # Let one probe through, a probe that hangs is replaced after another `reset`
+            logger.info("Probing whether the clockify api has recovered")
+            self._write(connection, "half_open", failures)
+
+    def record_success(self):
+        """Close the breaker after a successful request"""
+        if self._read(self.connection)[:2] == ("closed", 0):
+            return
+        with self.transaction() as connection:
+            state, failures, _ = self._read(connection)
+            if state != "closed" or failures:
+                if state != "closed":
+                    logger.info("The clockify api has recovered")
+                self._write(connection, "closed", 0)
+
+    def record_failure(self):
+        """Count a failed request, opens the breaker once there are too many in a row"""
+        with self.transaction() as connection:
+            state, failures, _ = self._read(connection)
+            failures += 1
+            if state == "half_open" or failures >= self.failures:
+                if state != "open":
+                    logger.warning(
+                        "The clockify api is failing, requests fail fast for %ss",
+                        self.reset,
+                    )
+                self._write(connection, "open", failures)
+            else:
+                self._write(connection, state, failures)
@@ -3,8 +3,20 @@
 import json
 import logging
 import datetime
+import itertools
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    as_completed,
+    wait,
+)
 import dateutil
 import requests
+from tp_timesheet import tracing
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +24,8 @@ logger = logging.getLogger(__name__)
 class Clockify:
     """Clockify class, contains all methods required to set up and submit entry to clockify"""
 
+    # pylint: disable=too-many-instance-attributes
+
     task_project_dict = {
         "live": ("Live hours", "NLx"),
         "training": ("Training", "NLx"),
@@ -21,38 +35,317 @@ class Clockify:
     project_id_cache = {}
     task_id_cache = {}
     locale_id_cache = {}
+    # api key -> (workspace_id, user_id, timezone, start_time), shared by all instances
+    workspace_user_cache = {}
+    # One lock per (api key, date) so concurrent submissions of the same day cannot interleave
+    date_locks = {}
+    date_locks_guard = threading.Lock()
 
     api_base_endpoint = "https://api.clockify.me/api/v1"
+    # (connect, read) timeouts in seconds, overridden per endpoint from the config file
+    default_timeouts = {"default": (3.05, 5.0)}
+    # GET endpoints that are idempotent and therefore safe to hedge
+    hedged_endpoints = ("user", "projects", "tasks", "tags", "time_entries")
+    # GET endpoints whose responses rarely change and are kept in the http cache
+    cached_endpoints = ("user", "projects", "tasks", "tags")
+    # Items per page of the project, task and tag lookups
+    page_size = 50
+    # Largest page the api serves, and the time entries expected per day when sizing the
+    # pages of a range of dates so a range is fetched in as few requests as possible
+    max_page_size = 5000
+    entries_per_day = 10
+    # Seconds a prefetched snapshot of a date is trusted for, older ones are fetched again so
+    # entries changed by another run in the meantime are not missed
+    prefetch_max_age = 30
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        api_key,
+        locale,
+        timeouts=None,
+        hedge=False,
+        session=None,
+        metadata=None,
+        rate_limiter=None,
+        http_cache=None,
+        circuit_breaker=None,
+        concurrency_limiter=None,
+    ):
+        """Nothing is requested on creation, the workspace, user, timezone and locale are
+        resolved on first use and shared with later Clockify objects using the same api key.
 
-    def __init__(self, api_key, locale):
+        Args:
+            metadata (dict): previously resolved workspace metadata (see `metadata`), skips
+                the /user and /tags requests when given
+            rate_limiter (SharedRateLimiter): budget every request is drawn from
+            http_cache (HTTPCache): cache of the metadata GET responses
+            circuit_breaker (CircuitBreaker): fails requests fast while the api is down
+            concurrency_limiter (AdaptiveConcurrencyLimiter): adapts the number of requests in
+                flight to the latency and errors of the api
+        """
         self.api_key = api_key
+        self.locale = locale
+        self.timeouts = {**self.default_timeouts, **(timeouts or {})}
+        self.hedge = hedge
+        self.session = session if session is not None else requests.Session()
+        self.rate_limiter = rate_limiter
+        self.http_cache = http_cache
+        self.circuit_breaker = circuit_breaker
+        self.concurrency_limiter = concurrency_limiter
+        self.latencies = {}
+        # Responses per http status ("error" when no response was received)
+        self.status_counts = Counter()
+        # Response bytes per endpoint, as sent over the wire (compressed)
+        self.bytes_received = Counter()
+        self._status_lock = threading.Lock()
+        self._hedge_pool = None
+        # (date, tasks) -> POST bodies built ahead of time, see `tp_timesheet.prepare`
+        self.prepared_entries = {}
+        # date -> (time fetched, time entries) fetched with the rest of a range, see
+        # `prefetch_time_entries`
+        self.prefetched_entries = {}
+        self._prefetch_lock = threading.Lock()
+
+        self._workspace_user = None
+        self._locale_id = None
+        self._metadata_lock = threading.RLock()
+        if metadata:
+            start_time = datetime.datetime.strptime(metadata["start_time"], "%H:%M")
+            self._workspace_user = (
+                metadata["workspace_id"],
+                metadata["user_id"],
+                metadata["timezone"],
+                start_time.time(),
+            )
+            self._locale_id = metadata["locale_id"]
+
+    def _resolve_workspace_user(self):
+        """Workspace id, user id, timezone and start time, requested on first use only"""
+        if self._workspace_user is None:
+            with self._metadata_lock:
+                if self.api_key not in self.workspace_user_cache:
+                    with tracing.span("resolve workspace"):
+                        self.workspace_user_cache[
+                            self.api_key
+                        ] = self._get_workspace_user_id()
+                self._workspace_user = self.workspace_user_cache[self.api_key]
+        return self._workspace_user
+
+    @property
+    def workspace_id(self):
+        """Active workspace identifier"""
+        return self._resolve_workspace_user()[0]
+
+    @property
+    def user_id(self):
+        """User identifier"""
+        return self._resolve_workspace_user()[1]
+
+    @property
+    def timezone(self):
+        """Timezone of the user in Region/City format eg) 'Asia/Singapore'"""
+        return self._resolve_workspace_user()[2]
+
+    @property
+    def start_time(self):
+        """Start of the user's day eg) datetime.time(8, 30)"""
+        return self._resolve_workspace_user()[3]
+
+    @property
+    def locale_id(self):
+        """Identifier of the tag of the locale"""
+        if self._locale_id is None:
+            with self._metadata_lock:
+                if self._locale_id is None:
+                    with tracing.span("resolve locale", locale=self.locale):
+                        self._locale_id = self._get_locale_id(self.locale)
+        return self._locale_id
+
+    @property
+    def metadata(self):
+        """Resolved workspace metadata, json serializable so it can be stored"""
+        return {
+            "workspace_id": self.workspace_id,
+            "user_id": self.user_id,
+            "timezone": self.timezone,
+            "start_time": self.start_time.strftime("%H:%M"),
+            "locale_id": self.locale_id,
+        }
+
+    # pylint: disable=too-many-arguments
+    def submit_all(
+        self, submissions, dry_run=False, workers=1, on_submitted=None, planned=None
+    ):
+        """Submit a list of (date, task_and_hours) pairs using up to `workers` concurrent dates
 
-        (
-            self.workspace_id,
-            self.user_id,
-            self.timezone,
-            self.start_time,
-        ) = self._get_workspace_user_id()
-        self.locale_id = self._get_locale_id(locale)
+        The whole run is planned (see `plan`) before anything is written, so an unknown task,
+        project or tag fails the run without touching any date. Every date is then its own
+        transaction (see `submit_clockify`). On the first failure the dates that have not started
+        yet are cancelled, dates already in flight are left to finish or roll back, and the error
+        is re-raised.
+
+        Args:
+            on_submitted (callable): called with (date, task_and_hours, entry_ids) once a date
+                has been submitted
+            planned (dict): result of `plan` for these submissions, planned here when not given
+        """
+        if planned is None:
+            planned = self.plan(submissions)
+
+        def submit(date, task_and_hours):
+            entry_ids = self.submit_clockify(
+                date,
+                task_and_hours,
+                dry_run=dry_run,
+                entries=planned[self.plan_key(date, task_and_hours)],
+            )
+            if on_submitted is not None:
+                on_submitted(date, task_and_hours, entry_ids)
+
+        if not dry_run and len(submissions) > 1:
+            with tracing.span("prefetch time entries", dates=len(submissions)):
+                self.prefetch_time_entries([date for date, _ in submissions])
+        with tracing.span(
+            "submit dates", dates=len(submissions), workers=workers
+        ), ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(submit, date, task_and_hours)
+                for date, task_and_hours in submissions
+            ]
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    raise future.exception()
+
+    def submit_clockify(self, date, task_and_hours, dry_run=False, entries=None):
+        """Submit entry to clockify
+
+        The day is replaced atomically: the new entries are staged (all ids resolved) before any
+        write, the existing entries are snapshotted, and if any delete or post fails the entries
+        posted so far are removed and the snapshot is restored before the error is re-raised.
+        The circuit breaker is checked once before the first delete, a breaker opening part way
+        through (in this or another process) does not stop the writes or the rollback of the day.
+
+        Args:
+            entries (list): POST bodies of the date when already built, see `plan`
 
-    def submit_clockify(self, date, task_and_hours, dry_run=False):
-        """Submit entry to clockify"""
+        Returns:
+            entry_ids (list): ids of the posted time entries, empty for a dry run
+        """
+        with tracing.span("submit date", date=date, tasks=task_and_hours):
+            if entries is None:
+                entries = self.build_time_entries(date, task_and_hours)
+
+            if dry_run:
+                logger.info(
+                    "This is a DRY-RUN, api POST is not being sent. Use --verbose to see more."
+                )
+                for time_entry_json in entries:
+                    logger.debug("POST:  %s\n", time_entry_json)
+                return []
+
+            with self._date_lock(date):
+                with self._prefetch_lock:
+                    fetched, snapshot = self.prefetched_entries.pop(date, (0, None))
+                if (
+                    snapshot is None
+                    or time.monotonic() - fetched > self.prefetch_max_age
+                ):
+                    snapshot = self.get_time_entries(date)
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.before_request()
+                deleted, posted = [], []
+                try:
+                    for entry in snapshot:
+                        self._delete_time_entry(entry["id"], bypass_breaker=True)
+                        deleted.append(entry)
+                    for time_entry_json in entries:
+                        posted.append(
+                            self._post_time_entry(time_entry_json, bypass_breaker=True)
+                        )
+                except Exception:
+                    logger.warning("Submission for %s failed, rolling back", date)
+                    with tracing.span(
+                        "rollback", posted=len(posted), deleted=len(deleted)
+                    ):
+                        self._rollback(posted, deleted)
+                    raise
+            return posted
+
+    @staticmethod
+    def plan_key(date, task_and_hours):
+        """Key of a date's entries in a plan, and in `prepared_entries`"""
+        return (date, json.dumps(task_and_hours, sort_keys=True))
+
+    def plan(self, submissions):
+        """Resolve and validate every date, task, project and tag of a run, without writing
+
+        Task names are checked first, without any request. The workspace, the locale tag and
+        every distinct project and task of the dates without prepared entries (see
+        `tp_timesheet.prepare`) are then looked up once each, and the POST bodies of all the
+        dates are built from the resolved ids. A fully prepared run sends no request.
+
+        Raises:
+            ValueError: listing every unknown task, project or tag of the run
 
-        if not dry_run:
-            # delete time entry if exist
-            self.delete_time_entry(date)
+        Returns:
+            planned (dict): (date, task_and_hours) key (see `plan_key`) -> POST bodies
+        """
+        tasks = sorted(
+            {task for _, task_and_hours in submissions for task in task_and_hours}
+        )
+        unknown = [task for task in tasks if task not in self.task_project_dict]
+        if unknown:
+            raise ValueError(
+                f"Unknown task(s) {unknown}, choose from {list(self.task_project_dict)}"
+            )
+        unprepared = [
+            (date, task_and_hours)
+            for date, task_and_hours in submissions
+            if self.plan_key(date, task_and_hours) not in self.prepared_entries
+        ]
+        lookups = [lambda: self.locale_id] if unprepared else []
+        lookups += [
+            lambda task=task: self.get_task_id(self.get_project_id(task), task)
+            for task in sorted(
+                {task for _, task_and_hours in unprepared for task in task_and_hours}
+            )
+        ]
+        errors = []
+        for lookup in lookups:
+            try:
+                lookup()
+            except ValueError as error:
+                errors.append(str(error))
+        if errors:
+            raise ValueError("Invalid run, nothing was submitted: " + "; ".join(errors))
+        return {
+            self.plan_key(date, task_and_hours): self.build_time_entries(
+                date, task_and_hours
+            )
+            for date, task_and_hours in submissions
+        }
 
-        # post entry
+    def build_time_entries(self, date, task_and_hours):
+        """Build the POST bodies for a date, all ids are resolved before anything is sent"""
+        prepared_key = self.plan_key(date, task_and_hours)
+        if prepared_key in self.prepared_entries:
+            logger.debug("Using prepared time entries for %s", date)
+            return self.prepared_entries[prepared_key]
+        entries = []
         start_time = self.start_time
         for task, hour in task_and_hours.items():
-            self._post_time_entry(date, task, start_time, hour, dry_run)
+            entries.append(self._build_time_entry(date, task, start_time, hour))
             start_time = (
                 datetime.datetime.combine(datetime.date(1, 1, 1), start_time)
                 + datetime.timedelta(hours=hour)
             ).time()
+        return entries
 
-    def _post_time_entry(self, date, task, start_time, hour, dry_run):
-        """Post a time entry to clockify"""
+    def _build_time_entry(self, date, task, start_time, hour):
+        """Build a time entry POST body"""
 
         # Timestamps via API need to be UTC
         # Create a timezone aware datetime object
@@ -69,7 +362,7 @@ class Clockify:
 
         project_id = self.get_project_id(task)
         task_id = self.get_task_id(project_id, task)
-        time_entry_json = {
+        return {
             "start": start_timestamp,
             "end": end_timestamp,
             "projectId": project_id,
@@ -77,36 +370,79 @@ class Clockify:
             "tagIds": [self.locale_id],
         }
 
-        if dry_run:
-            logger.info(
-                "This is a DRY-RUN, api POST is not being sent. Use --verbose to see more."
-            )
-            logger.debug("POST:  %s\n", time_entry_json)
-        else:
-            response = requests.post(
-                f"{self.api_base_endpoint}/workspaces/{self.workspace_id}/time-entries",
-                headers={"X-Api-Key": self.api_key},
-                json=time_entry_json,
-                timeout=5,
-            )
-            logger.debug(
-                "POST:  %s\nResponse: %s",
-                time_entry_json,
-                response.text,
+    def _post_time_entry(self, time_entry_json, bypass_breaker=False):
+        """Post a time entry to clockify
+
+        Args:
+            bypass_breaker (bool): send it even while the circuit breaker is open
+
+        Returns:
+            time_entry_id (str): identifier of the created entry
+        """
+        response = self._request(
+            "POST",
+            f"/workspaces/{self.workspace_id}/time-entries",
+            json=time_entry_json,
+            bypass_breaker=bypass_breaker,
+        )
+        logger.debug(
+            "POST:  %s\nResponse: %s",
+            time_entry_json,
+            response.text,
+        )
+        response.raise_for_status()
+        return json.loads(response.text)["id"]
+
+    def _rollback(self, posted, deleted):
+        """Remove the partially posted entries and restore the snapshot of deleted entries
+
+        These compensating requests are sent even while the circuit breaker is open, leaving
+        the day half written would be worse than a few more requests to a failing api.
+        """
+        try:
+            for entry_id in posted:
+                self._delete_time_entry(entry_id, bypass_breaker=True)
+            for entry in deleted:
+                restored = {
+                    "start": entry["timeInterval"]["start"],
+                    "end": entry["timeInterval"]["end"],
+                    "projectId": entry.get("projectId"),
+                    "taskId": entry.get("taskId"),
+                    "tagIds": entry.get("tagIds") or [],
+                    "description": entry.get("description") or "",
+                    "billable": entry.get("billable", False),
+                }
+                self._post_time_entry(restored, bypass_breaker=True)
+        except Exception:  # pylint: disable=broad-except
+            logger.critical(
+                "Rollback failed, entries may need to be fixed manually. Deleted: %s",
+                deleted,
+                exc_info=True,
             )
-            response.raise_for_status()
 
-    def get_time_entry_id(self, date):
-        """Get a time entry from clockify on a certain date"""
+    def _date_lock(self, date):
+        """Get the lock serializing transactions on a date"""
+        with self.date_locks_guard:
+            return self.date_locks.setdefault((self.api_key, date), threading.Lock())
+
+    def get_time_entries(self, date):
+        """Get all time entries from clockify on a certain date"""
+        return self.get_time_entries_between(date, date)
+
+    def get_time_entries_between(self, first_date, last_date):
+        """Get all time entries from clockify from `first_date` to `last_date` (inclusive)
+
+        Pages are sized for the number of days so a range usually takes a single request.
+        """
 
         # Timestamps via API need to be UTC
         # Create a timezone aware datetime object
         tz_file = dateutil.tz.gettz(self.timezone)
         start_dt = datetime.datetime.combine(
-            date, datetime.time(0, 0, 0), tzinfo=tz_file
+            first_date, datetime.time(0, 0, 0), tzinfo=tz_file
         )
         end_dt = datetime.datetime.combine(
-            date, datetime.time(23, 59, 59), tzinfo=tz_file
+            last_date, datetime.time(23, 59, 59), tzinfo=tz_file
         )
         # Generate ISO (POSIX datetime) strings in UTC format
         start_timestamp = start_dt.astimezone(datetime.timezone.utc).strftime(
@@ -117,33 +453,57 @@ class Clockify:
         )
 
         params = {"start": start_timestamp, "end": end_timestamp}
-
-        response = requests.get(
-            f"{self.api_base_endpoint}/workspaces/{self.workspace_id}/user/{self.user_id}/time-entries",
-            headers={"X-Api-Key": self.api_key},
-            params=params,
-            timeout=5,
+        days = (last_date - first_date).days + 1
+        page_size = min(
+            self.max_page_size, max(self.page_size, days * self.entries_per_day)
         )
-        response.raise_for_status()
-        response_list = json.loads(response.text)
+        return list(
+            self._paginate(
+                f"/workspaces/{self.workspace_id}/user/{self.user_id}/time-entries",
+                params,
+                page_size=page_size,
+            )
+        )
+
+    def prefetch_time_entries(self, dates):
+        """Fetch the time entries of all the dates at once, instead of one request per date
+
+        The entries are kept per date and used as the snapshot of the date's submission, as long
+        as it starts within `prefetch_max_age` seconds.
+        """
+        tz_file = dateutil.tz.gettz(self.timezone)
+        fetched = time.monotonic()
+        entries = self.get_time_entries_between(min(dates), max(dates))
+        by_date = {date: [] for date in dates}
+        for entry in entries:
+            start = datetime.datetime.fromisoformat(
+                entry["timeInterval"]["start"].replace("Z", "+00:00")
+            )
+            by_date.get(start.astimezone(tz_file).date(), []).append(entry)
+        with self._prefetch_lock:
+            self.prefetched_entries.update(
+                (date, (fetched, date_entries))
+                for date, date_entries in by_date.items()
+            )
 
-        # Extract time entries
-        time_entry_ids = []
-        if response_list:
-            for entry in response_list:
-                time_entry_ids.append(entry["id"])
-        return time_entry_ids
+    def get_time_entry_id(self, date):
+        """Get a time entry from clockify on a certain date"""
+        return [entry["id"] for entry in self.get_time_entries(date)]
 
     def delete_time_entry(self, date):
         """Delete a time entry from clockify"""
         time_entry_ids = self.get_time_entry_id(date)
         for entry in time_entry_ids:
-            response = requests.delete(
-                f"{self.api_base_endpoint}/workspaces/{self.workspace_id}/time-entries/{entry}",
-                headers={"X-Api-Key": self.api_key},
-                timeout=5,
-            )
-            response.raise_for_status()
+            self._delete_time_entry(entry)
+
+    def _delete_time_entry(self, time_entry_id, bypass_breaker=False):
+        """Delete a single time entry by id"""
+        response = self._request(
+            "DELETE",
+            f"/workspaces/{self.workspace_id}/time-entries/{time_entry_id}",
+            bypass_breaker=bypass_breaker,
+        )
+        response.raise_for_status()
 
     def _get_workspace_user_id(self):
         """Send request to get workspace id
@@ -157,11 +517,7 @@ class Clockify:
             timezone (str): timezone in Region/City format eg) 'Asia/Singapore'
             start_time (datetime.time): time object eg) datetime.time(8, 30)
         """
-        get_request = requests.get(
-            f"{self.api_base_endpoint}/user",
-            headers={"X-Api-Key": self.api_key},
-            timeout=5,
-        )
+        get_request = self._request("GET", "/user")
         get_request.raise_for_status()
         request_dict = json.loads(get_request.text)
         workspace_id = request_dict["activeWorkspace"]
@@ -181,22 +537,17 @@ class Clockify:
             return project_id
         logger.debug("project_id is not found on cache, fetching...")
 
-        get_request = requests.get(
-            f"{self.api_base_endpoint}/workspaces/{self.workspace_id}/projects",
-            headers={"X-Api-Key": self.api_key},
-            timeout=5,
-        )
-        get_request.raise_for_status()
-        request_list = json.loads(get_request.text)
-
-        for dic in request_list:
-            if dic["name"] == project:
-                logger.debug("Storing fetched project_id in cache: %s", dic["id"])
-                self.project_id_cache[project] = dic["id"]
-                return dic["id"]
-        raise ValueError(
-            f'Could not find project named "{project}", check your project name'
+        project_id = self._find_by_name(
+            f"/workspaces/{self.workspace_id}/projects",
+            project,
+            self.project_id_cache,
         )
+        if project_id is None:
+            raise ValueError(
+                f'Could not find project named "{project}", check your project name'
+            )
+        logger.debug("Storing fetched project_id in cache: %s", project_id)
+        return project_id
 
     def get_task_id(self, project_id, task_short):
         """Send request to get task id"""
@@ -208,38 +559,230 @@ class Clockify:
             return task_id
         logger.debug("task_id is not found on cache, fetching...")
 
-        get_request = requests.get(
-            f"{self.api_base_endpoint}/workspaces/{self.workspace_id}/projects/{project_id}/tasks",
-            headers={"X-Api-Key": self.api_key},
-            timeout=5,
-        )
-        get_request.raise_for_status()
-        request_list = json.loads(get_request.text)
-
-        for dic in request_list:
-            if dic["name"] == task_full:
-                logger.debug("Storing fetched task_id in cache: %s", dic["id"])
-                self.task_id_cache[task_full] = dic["id"]
-                return dic["id"]
-        raise ValueError(
-            f'Could not find task named "{task_short}", check your task name'
+        task_id = self._find_by_name(
+            f"/workspaces/{self.workspace_id}/projects/{project_id}/tasks",
+            task_full,
+            self.task_id_cache,
         )
+        if task_id is None:
+            raise ValueError(
+                f'Could not find task named "{task_short}", check your task name'
+            )
+        logger.debug("Storing fetched task_id in cache: %s", task_id)
+        return task_id
 
     def _get_locale_id(self, locale):
         if locale in self.locale_id_cache:
             return self.locale_id_cache[locale]
 
-        get_request = requests.get(
-            f"{self.api_base_endpoint}/workspaces/{self.workspace_id}/tags",
-            headers={"X-Api-Key": self.api_key},
-            timeout=5,
+        locale_id = self._find_by_name(
+            f"/workspaces/{self.workspace_id}/tags", locale, self.locale_id_cache
         )
-        get_request.raise_for_status()
-        request_list = json.loads(get_request.text)
-        for dic in request_list:
-            if dic["name"] == locale:
-                self.locale_id_cache[locale] = dic["id"]
-                return dic["id"]
-        raise ValueError(
-            f'Could not find locale named "{locale}", check your locale tag'
+        if locale_id is None:
+            raise ValueError(
+                f'Could not find locale named "{locale}", check your locale tag'
+            )
+        return locale_id
+
+    def _find_by_name(self, path, name, index):
+        """Look up the id of a named project, task or tag
+
+        The api filters by name server side, the pages of matches are walked until the exact
+        name is found. Every name seen on the way is stored in `index` (name -> id), so later
+        lookups of those names are served from memory.
+
+        Returns:
+            id (str): identifier of the match, None when there is no item with that name
+        """
+        params = {"name": name, "strict-name-search": "true"}
+        for item in self._paginate(path, params):
+            index.setdefault(item["name"], item["id"])
+            if item["name"] == name:
+                return item["id"]
+        return None
+
+    def _paginate(self, path, params=None, page_size=None):
+        """Iterate over the items of a paginated GET endpoint, fetching pages on demand"""
+        page_size = page_size or self.page_size
+        for page in itertools.count(1):
+            get_request = self._request(
+                "GET",
+                path,
+                params={**(params or {}), "page": page, "page-size": page_size},
+            )
+            get_request.raise_for_status()
+            items = json.loads(get_request.text) or []
+            yield from items
+            if len(items) < page_size:
+                return
+
+    @staticmethod
+    def endpoint_name(path):
+        """Name of the endpoint a request path belongs to, used to look up timeouts
+
+        eg) '/workspaces/{id}/projects/{id}/tasks' -> 'tasks'
+        """
+        if path == "/user":
+            return "user"
+        parts = path.strip("/").split("/")
+        for part in reversed(parts):
+            if part in ("projects", "tasks", "tags", "time-entries"):
+                return part.replace("-", "_")
+        return "default"
+
+    def _request(self, method, path, bypass_breaker=False, **kwargs):
+        """Send a request to the clockify api
+
+        Every api call goes through here so connect/read timeouts are looked up per endpoint,
+        metadata GETs are served from the http cache and idempotent GETs can be hedged.
+
+        Args:
+            method (str): http method
+            path (str): path relative to `api_base_endpoint`
+            bypass_breaker (bool): send it even while the circuit breaker is open, for the writes
+                of a transaction that has started and its rollback
+            kwargs: passed on to `requests.Session.request` eg) params, json
+
+        Returns:
+            response (requests.Response): response of the request, not checked for errors
+        """
+        endpoint = self.endpoint_name(path)
+        with tracing.span(f"{method} {endpoint}") as span_args:
+            if (
+                method == "GET"
+                and self.http_cache is not None
+                and endpoint in self.cached_endpoints
+            ):
+                response = self._cached_get(path, endpoint, **kwargs)
+            elif method == "GET" and self.hedge and endpoint in self.hedged_endpoints:
+                response = self._hedged_request(method, path, endpoint, **kwargs)
+            else:
+                response = self._send(
+                    method, path, endpoint, bypass_breaker=bypass_breaker, **kwargs
+                )
+            if span_args is not None:
+                span_args["status"] = response.status_code
+        return response
+
+    def _cached_get(self, path, endpoint, **kwargs):
+        """GET served from the http cache while fresh, revalidated with the api otherwise"""
+        key = self.http_cache.key(self.api_key, path, kwargs.get("params"))
+        cached = self.http_cache.lookup(key)
+        url = f"{self.api_base_endpoint}{path}"
+        if cached is not None and self.http_cache.is_fresh(cached):
+            self.http_cache.stats["fresh"] += 1
+            return self.http_cache.to_response(cached, url)
+
+        headers = self.http_cache.validators(cached)
+        if self.hedge and endpoint in self.hedged_endpoints:
+            response = self._hedged_request(
+                "GET", path, endpoint, headers=headers, **kwargs
+            )
+        else:
+            response = self._send("GET", path, endpoint, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            logger.debug("Cached %s response is still valid", endpoint)
+            self.http_cache.stats["revalidated"] += 1
+            self.http_cache.refresh(key)
+            return self.http_cache.to_response(cached, url)
+        self.http_cache.stats["miss"] += 1
+        if response.status_code == 200:
+            self.http_cache.store(key, response)
+        return response
+
+    # pylint: disable=too-many-arguments
+    def _send(
+        self, method, path, endpoint, headers=None, bypass_breaker=False, **kwargs
+    ):
+        """Send a single request and record its latency
+
+        Connection errors, timeouts and 5xx responses count as failures of the api for the
+        circuit breaker, while it is open `CircuitOpenError` is raised without sending anything
+        unless `bypass_breaker` is set.
+        """
+        if self.circuit_breaker is not None and not bypass_breaker:
+            self.circuit_breaker.before_request()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        sent = (
+            self.concurrency_limiter.acquire()
+            if self.concurrency_limiter is not None
+            else None
+        )
+        started = time.perf_counter()
+        overloaded = False
+        try:
+            response = self.session.request(
+                method,
+                f"{self.api_base_endpoint}{path}",
+                headers={"X-Api-Key": self.api_key, **(headers or {})},
+                timeout=self.timeouts.get(endpoint, self.timeouts["default"]),
+                **kwargs,
+            )
+            overloaded = response.status_code == 429 or response.status_code >= 500
+        except (requests.ConnectionError, requests.Timeout):
+            overloaded = True
+            self._count_status("error")
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure()
+            raise
+        finally:
+            if self.concurrency_limiter is not None:
+                self.concurrency_limiter.release(
+                    sent, overloaded, f"{method} {endpoint}"
+                )
+        self._count_status(str(response.status_code))
+        self._count_bytes(endpoint, response)
+        if self.circuit_breaker is not None:
+            if response.status_code >= 500:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+        self.latencies.setdefault(endpoint, deque(maxlen=100)).append(
+            time.perf_counter() - started
         )
+        return response
+
+    def _count_status(self, status):
+        with self._status_lock:
+            self.status_counts[status] += 1
+
+    def _count_bytes(self, endpoint, response):
+        """Count the size of a response body, compressed when the api compressed it"""
+        size = response.headers.get("Content-Length")
+        size = int(size) if size is not None else len(response.content)
+        with self._status_lock:
+            self.bytes_received[endpoint] += size
+
+    def _hedge_delay(self, endpoint):
+        """Delay before a hedged request is fired, the p95 of the endpoint's latency so far
+
+        Until enough samples exist, half of the read timeout is used.
+        """
+        samples = sorted(self.latencies.get(endpoint, ()))
+        if len(samples) < 10:
+            _, read_timeout = self.timeouts.get(endpoint, self.timeouts["default"])
+            return read_timeout / 2
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _hedged_request(self, method, path, endpoint, **kwargs):
+        """Send a request and, if it is slower than the p95 delay, a second identical one.
+
+        Whichever succeeds first is returned, if both fail the first error is raised.
+        """
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(thread_name_prefix="hedge")
+        first = self._hedge_pool.submit(self._send, method, path, endpoint, **kwargs)
+        try:
+            return first.result(timeout=self._hedge_delay(endpoint))
+        except FutureTimeoutError:
+            logger.debug("Hedging slow %s request to %s", method, endpoint)
+        second = self._hedge_pool.submit(self._send, method, path, endpoint, **kwargs)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        return first.result()
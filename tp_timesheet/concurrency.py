@@ -0,0 +1,102 @@
+""" Adaptive limit on the requests in flight to the clockify api """
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:  # pylint: disable=too-many-instance-attributes
+    """AIMD (additive increase, multiplicative decrease) limit on the requests in flight
+
+    While the limit is in use, every successful response raises it by 1/limit, about one request
+    per round of responses. A 429, a 5xx, a connection error, or the smoothed latency of an
+    endpoint rising above `tolerance` times the fastest response of that same endpoint,
+    multiplies it by `backoff`, so slower endpoints eg) writes are not mistaken for congestion.
+    Responses to requests sent before the last decrease are part of the same congestion event
+    and do not decrease it again.
+
+    Args:
+        initial (int): limit to start from
+        maximum (int): the limit never grows above this
+    """
+
+    # Latencies below this many seconds are too small to tell apart
+    latency_floor = 0.005
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, initial=4, minimum=1, maximum=16, backoff=0.5, tolerance=2.0):
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.decreases = 0
+        # endpoint -> fastest and smoothed latency of its responses
+        self.min_latency = {}
+        self.smoothed_latency = {}
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait for room under the limit and count the request in flight
+
+        Returns:
+            sent (float): time the request is sent, to be passed to `release`
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return time.monotonic()
+
+    def release(self, sent, overloaded=False, endpoint="default"):
+        """Count a request as done and adjust the limit to how it went
+
+        Args:
+            sent (float): value returned by `acquire`
+            overloaded (bool): the api answered with a 429 or a 5xx, or could not be reached
+            endpoint (str): method and endpoint of the request, its latency is compared with
+                the earlier responses of the same endpoint only
+        """
+        now = time.monotonic()
+        latency = now - sent
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            slow = False
+            if not overloaded:
+                min_latency = min(self.min_latency.get(endpoint, latency), latency)
+                smoothed = self.smoothed_latency.get(endpoint)
+                smoothed = (
+                    latency if smoothed is None else 0.8 * smoothed + 0.2 * latency
+                )
+                self.min_latency[endpoint] = min_latency
+                self.smoothed_latency[endpoint] = smoothed
+                slow = smoothed > self.tolerance * max(min_latency, self.latency_floor)
+            if overloaded or slow:
+                if sent >= self._last_decrease:
+                    self._last_decrease = now
+                    self.decreases += 1
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    logger.debug(
+                        "Lowered the concurrency limit to %.1f (%s)",
+                        self.limit,
+                        "overloaded" if overloaded else "latency rising",
+                    )
+            elif saturated:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self):
+        """Current and peak requests in flight, and the limit the controller converged on"""
+        with self._condition:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "limit": round(self.limit, 2),
+                "decreases": self.decreases,
+            }
@@ -29,12 +29,44 @@ class Config:
         "clockify_api_key": "AbCD1234AbCD1234AbCD1234AbCD1234AbCD1234AbCD1234"
     }
     locale_list = ["en_AU", "en_SG", "ko_KR", "ms_MY", "th_TH"]
+    # backends of `tp_timesheet.notify`, "auto" picks the first available one
+    notification_backend_list = ["auto", "osascript", "notify-send", "log"]
     locale_tag = {"locale_tag": "xx_XX"}
+    # "connect, read" in seconds, can be overridden per endpoint with optional keys named
+    # http_timeout_<endpoint> (endpoints: user, projects, tasks, tags, time_entries)
+    http_timeout_dict = {"http_timeout": "3.05, 5"}
+    http_hedge_dict = {"http_hedge": "False"}
+    # requests per second shared by all tp-timesheet processes on this host, 0 to disable
+    http_rate_limit_dict = {"http_rate_limit": "45"}
+    # seconds a cached metadata response is used before it is revalidated, -1 disables caching
+    http_cache_ttl_dict = {"http_cache_ttl": "300"}
+    # consecutive failed requests after which requests fail fast (0 disables the breaker) and
+    # seconds until a probe request checks whether the api has recovered
+    http_breaker_failures_dict = {"http_breaker_failures": "5"}
+    http_breaker_reset_dict = {"http_breaker_reset": "30"}
+    # most requests in flight per user, the actual limit adapts to the latency and errors of the
+    # api up to this (0 disables the adaptive limit)
+    http_max_concurrency_dict = {"http_max_concurrency": "16"}
+    # auto, osascript, notify-send or log, and seconds before a notification is closed
+    notification_backend_dict = {"notification_backend": "auto"}
+    notification_timeout_dict = {"notification_timeout": "10"}
+    # local time window the scheduled job runs in, every user gets their own time within it
+    schedule_window_dict = {"schedule_window": "09:00-10:00"}
     DEFAULT_CONF = {
         **sanity_check_bool_dict,
         **sanity_check_range_dict,
         **clockify_api_key,
         **locale_tag,
+        **http_timeout_dict,
+        **http_hedge_dict,
+        **http_rate_limit_dict,
+        **http_cache_ttl_dict,
+        **http_breaker_failures_dict,
+        **http_breaker_reset_dict,
+        **http_max_concurrency_dict,
+        **notification_backend_dict,
+        **notification_timeout_dict,
+        **schedule_window_dict,
     }
 
     @classmethod
@@ -63,6 +95,43 @@ class Config:
         cls.CLOCKIFY_API_KEY = config.get(
             "configuration", next(iter(cls.clockify_api_key))
         )
+        cls.HTTP_TIMEOUTS = cls.parse_http_timeouts(config)
+        cls.HTTP_HEDGE = config.getboolean(
+            "configuration", next(iter(cls.http_hedge_dict))
+        )
+        cls.HTTP_RATE_LIMIT = config.getfloat(
+            "configuration", next(iter(cls.http_rate_limit_dict))
+        )
+        cls.HTTP_CACHE_TTL = config.getfloat(
+            "configuration", next(iter(cls.http_cache_ttl_dict))
+        )
+        cls.HTTP_BREAKER_FAILURES = config.getint(
+            "configuration", next(iter(cls.http_breaker_failures_dict))
+        )
+        cls.HTTP_BREAKER_RESET = config.getfloat(
+            "configuration", next(iter(cls.http_breaker_reset_dict))
+        )
+        cls.HTTP_MAX_CONCURRENCY = config.getint(
+            "configuration", next(iter(cls.http_max_concurrency_dict))
+        )
+        cls.NOTIFICATION_BACKEND = config.get(
+            "configuration", next(iter(cls.notification_backend_dict))
+        )
+        if not cls.is_valid_notification_backend(cls.NOTIFICATION_BACKEND):
+            logger.warning(
+                "Unknown %s '%s' in %s, choose from %s. Notifications are only logged",
+                next(iter(cls.notification_backend_dict)),
+                cls.NOTIFICATION_BACKEND,
+                cls.CONFIG_PATH,
+                cls.notification_backend_list,
+            )
+            cls.NOTIFICATION_BACKEND = "log"
+        cls.NOTIFICATION_TIMEOUT = config.getfloat(
+            "configuration", next(iter(cls.notification_timeout_dict))
+        )
+        cls.SCHEDULE_WINDOW = config.get(
+            "configuration", next(iter(cls.schedule_window_dict))
+        )
 
     @classmethod
     def init_logger(cls):
@@ -91,6 +160,24 @@ class Config:
         file_handler.setFormatter(log_format)
         cls.ROOT_LOGGER.addHandler(file_handler)
 
+    @classmethod
+    def parse_http_timeouts(cls, config):
+        """Parse the default and per endpoint (connect, read) timeouts from the config
+
+        Returns:
+            timeouts (dict): eg) {"default": (3.05, 5.0), "time_entries": (3.05, 10.0)}
+        """
+        default_key = next(iter(cls.http_timeout_dict))
+        timeouts = {}
+        for key, value in config.items("configuration"):
+            if key != default_key and not key.startswith(f"{default_key}_"):
+                continue
+            values = [float(timeout) for timeout in value.split(",")]
+            connect_timeout, read_timeout = values if len(values) == 2 else values * 2
+            endpoint = key[len(default_key) + 1 :] or "default"
+            timeouts[endpoint] = (connect_timeout, read_timeout)
+        return timeouts
+
     @staticmethod
     def is_valid_key(api_key):
         """Check api key is valid"""
@@ -104,6 +191,11 @@ class Config:
         valid = locale in cls.locale_list
         return valid
 
+    @classmethod
+    def is_valid_notification_backend(cls, backend):
+        """Check notification backend is valid"""
+        return backend in cls.notification_backend_list
+
     @classmethod
     def _read_write_config(cls):
         """Function to read the config file or create one if it doesn't exist"""
@@ -58,6 +58,11 @@ def get_start_date(start_date_arg: str) -> datetime.date:
     return start_date
 
 
+def is_beyond_range(start_date: datetime.date, max_days) -> bool:
+    """check the start date is more than `max_days` days from today"""
+    return int(max_days) < abs(datetime.today().date() - start_date).days
+
+
 def assert_start_date(start_date: datetime.date) -> bool:
     """
     check the start date submitting is bounded within `n` days.
@@ -68,10 +73,8 @@ def assert_start_date(start_date: datetime.date) -> bool:
         False: when date is invalid and confirmed by user as invalid
     """
     start_date_str = start_date.strftime("%d/%m/%Y")
-    today = datetime.today().date()
-    if (
-        Config.SANITY_CHECK_START_DATE
-        and int(Config.SANITY_CHECK_RANGE) < abs(today - start_date).days
+    if Config.SANITY_CHECK_START_DATE and is_beyond_range(
+        start_date, Config.SANITY_CHECK_RANGE
     ):
         user_confirm = input(
             f"The entered date '{start_date_str}' "
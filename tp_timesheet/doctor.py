@@ -0,0 +1,193 @@
+""" Diagnostics of a slow or failing setup, times every phase of a run separately """
+import json
+import os
+import socket
+import ssl
+import time
+from datetime import date
+from urllib.parse import urlparse
+from workalendar.asia import Singapore
+from tp_timesheet.breaker import CircuitBreaker
+from tp_timesheet.date_utils import get_working_dates
+from tp_timesheet.http_cache import HTTPCache
+from tp_timesheet.jobqueue import JobQueue
+from tp_timesheet.journal import Journal
+from tp_timesheet.ledger import SubmissionLedger, user_key
+from tp_timesheet.prepare import PreparedRuns
+
+# Local stores reported by `cache_states`
+CACHE_NAMES = (
+    "http cache",
+    "prepared runs",
+    "ledger",
+    "journal",
+    "job queue",
+    "circuit breaker",
+)
+
+
+class Phases:
+    """Timings of the phases of a diagnosis, a failing phase is recorded with its error"""
+
+    def __init__(self):
+        self.results = []
+
+    def time(self, name, func, *args):
+        """Run and time a phase
+
+        Returns:
+            result: return value of `func`, None when it failed
+        """
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as error:  # pylint: disable=broad-except
+            self.add(name, time.perf_counter() - started, error=error)
+            return None
+        self.add(name, time.perf_counter() - started)
+        return result
+
+    def add(self, name, seconds, error=None):
+        """Record a phase timed elsewhere"""
+        self.results.append(
+            {
+                "phase": name,
+                "ms": round(seconds * 1000, 2),
+                "status": "ok" if error is None else f"error: {error}",
+            }
+        )
+
+
+def network_phases(phases, api_base_endpoint, api_key):
+    """Time the DNS resolution, connect, TLS handshake and first byte of GET /user"""
+    url = urlparse(api_base_endpoint)
+    addresses = phases.time(
+        "dns resolve", socket.getaddrinfo, url.hostname, 443, 0, socket.SOCK_STREAM
+    )
+    if not addresses:
+        return
+    address = addresses[0][4]
+    raw_socket = phases.time("tcp connect", socket.create_connection, address[:2], 5)
+    if raw_socket is None:
+        return
+    with raw_socket:
+        tls_socket = phases.time(
+            "tls handshake",
+            lambda: ssl.create_default_context().wrap_socket(
+                raw_socket, server_hostname=url.hostname
+            ),
+        )
+        if tls_socket is None:
+            return
+        with tls_socket:
+
+            def first_byte():
+                tls_socket.settimeout(10)
+                tls_socket.sendall(
+                    f"GET {url.path}/user HTTP/1.1\r\nHost: {url.hostname}\r\n"
+                    f"X-Api-Key: {api_key}\r\nConnection: close\r\n\r\n".encode("utf8")
+                )
+                if not tls_socket.recv(1):
+                    raise ConnectionError("Connection closed without a response")
+
+            phases.time("first byte of /user", first_byte)
+
+
+def lookup_phases(phases, clockify):
+    """Time the workspace, locale, project and task lookups, bypassing every cache"""
+    clockify.workspace_user_cache = {}
+    clockify.project_id_cache = {}
+    clockify.task_id_cache = {}
+    clockify.locale_id_cache = {}
+    clockify.http_cache = None
+    # pylint: disable=protected-access
+    if phases.time("lookup /user", clockify._resolve_workspace_user) is None:
+        return
+    phases.time("lookup locale tag", lambda: clockify.locale_id)
+    for task in clockify.task_project_dict:
+        project_id = phases.time(
+            f"lookup project of {task}", clockify.get_project_id, task
+        )
+        if project_id is not None:
+            phases.time(f"lookup task {task}", clockify.get_task_id, project_id, task)
+
+
+def cache_states(api_key, locale):
+    """State of the local stores, without creating any of them"""
+    states = {}
+    http_cache = HTTPCache()
+    if os.path.exists(http_cache.path):
+        entries, oldest = http_cache.connection.execute(
+            "SELECT COUNT(*), MIN(stored) FROM responses"
+        ).fetchone()
+        states["http cache"] = f"{entries} response(s)" + (
+            f", oldest {time.time() - oldest:.0f}s old" if entries else ""
+        )
+    prepared = PreparedRuns(api_key, locale)
+    if prepared.load():
+        states["prepared runs"] = ", ".join(sorted(prepared.runs)) or "metadata only"
+    ledger = SubmissionLedger()
+    if os.path.exists(ledger.path):
+        (submitted,) = ledger.connection.execute(
+            "SELECT COUNT(*) FROM submissions WHERE user = ?", (user_key(api_key),)
+        ).fetchone()
+        states["ledger"] = f"{submitted} submitted date(s)"
+    interrupted = Journal().interrupted()
+    if interrupted:
+        states["journal"] = f"{len(interrupted)} interrupted run(s) to resume"
+    job_queue = JobQueue()
+    if os.path.exists(job_queue.path):
+        states["job queue"] = json.dumps(job_queue.counts())
+    breaker = CircuitBreaker()
+    if os.path.exists(breaker.path):
+        states["circuit breaker"] = breaker.state
+    return {name: states.get(name, "empty") for name in CACHE_NAMES}
+
+
+def diagnose(config, clockify, config_seconds=None, network=True):
+    """Time every phase of a run and collect the state of the caches
+
+    Args:
+        config (Config): loaded config
+        clockify (Clockify): client to time the lookups with, its caches are bypassed
+        config_seconds (float): time it took to load the config
+        network (bool): whether to time the dns, connect, tls and first byte phases
+
+    Returns:
+        report (dict): phases, cache states and paths
+    """
+    phases = Phases()
+    if config_seconds is not None:
+        phases.add("config load", config_seconds)
+    if network:
+        network_phases(phases, clockify.api_base_endpoint, config.CLOCKIFY_API_KEY)
+    lookup_phases(phases, clockify)
+    start = date.today()
+    phases.time(
+        "working dates (1 year)",
+        lambda: get_working_dates(start=start, count=365, cal=Singapore()),
+    )
+    return {
+        "phases": phases.results,
+        "caches": cache_states(config.CLOCKIFY_API_KEY, config.LOCALE),
+        "paths": {
+            "config": str(config.CONFIG_PATH),
+            "logs": str(config.LOG_PATH),
+            "stores": str(config.CONFIG_DIR),
+        },
+    }
+
+
+def format_report(report):
+    """Table of a diagnosis report, one line per row"""
+    width = max(len(row["phase"]) for row in report["phases"])
+    lines = [f"{'phase':<{width}}  {'ms':>9}  status"]
+    lines += [
+        f"{row['phase']:<{width}}  {row['ms']:>9.2f}  {row['status']}"
+        for row in report["phases"]
+    ]
+    lines += ["", "caches:"]
+    lines += [f"  {name:<16} {state}" for name, state in report["caches"].items()]
+    lines += ["", "paths:"]
+    lines += [f"  {name:<16} {path}" for name, path in report["paths"].items()]
+    return lines
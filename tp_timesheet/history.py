@@ -0,0 +1,203 @@
+""" Indexed history of past runs, queried with --history """
+import json
+import sqlite3
+import time
+from collections import Counter
+from tp_timesheet.config import Config
+from tp_timesheet.store import SQLiteStore
+
+
+class RunLog:  # pylint: disable=too-few-public-methods
+    """What happened during one run, filled in as the run goes and stored when it ends"""
+
+    def __init__(self, mode, user=None):
+        self.mode = mode
+        self.user = user
+        self.started = time.time()
+        self.dates = []
+        self.error = None
+        self.clockify_objects = []
+
+
+class RunHistory(SQLiteStore):
+    """One row per run: timings, submitted dates, request counts per status, errors, the hit
+    rate of the http cache and the adaptive concurrency (peak requests in flight and the limit
+    converged on). Indexed on the start time, status and mode."""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started REAL NOT NULL,
+            duration REAL NOT NULL,
+            mode TEXT NOT NULL,
+            user TEXT,
+            status TEXT NOT NULL,
+            error TEXT,
+            dates TEXT NOT NULL,
+            date_count INTEGER NOT NULL,
+            requests INTEGER NOT NULL,
+            requests_by_status TEXT NOT NULL,
+            throttled INTEGER NOT NULL,
+            cache_hits INTEGER NOT NULL,
+            cache_misses INTEGER NOT NULL,
+            peak_concurrency INTEGER,
+            concurrency_limit REAL
+        );
+        CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+        CREATE INDEX IF NOT EXISTS runs_status ON runs (status, started);
+        CREATE INDEX IF NOT EXISTS runs_mode ON runs (mode, started);
+    """
+
+    # Columns added after the table was created, added to older history files on first use
+    added_columns = {"peak_concurrency": "INTEGER", "concurrency_limit": "REAL"}
+
+    def __init__(self, path=None):
+        super().__init__(path or Config.CONFIG_DIR.joinpath("history.sqlite"))
+
+    @property
+    def connection(self):
+        """Connection of the calling thread, older history files get the added columns"""
+        if getattr(self._local, "connection", None) is not None:
+            return self._local.connection
+        connection = super().connection
+        existing = {row[1] for row in connection.execute("PRAGMA table_info(runs)")}
+        for column, column_type in self.added_columns.items():
+            if column not in existing:
+                try:
+                    connection.execute(
+                        f"ALTER TABLE runs ADD COLUMN {column} {column_type}"
+                    )
+                except sqlite3.OperationalError:
+                    pass  # added by another process in the meantime
+        return connection
+
+    def record(self, run_log):
+        """Store a finished run"""
+        statuses, cache, concurrency = Counter(), Counter(), []
+        for clockify in run_log.clockify_objects:
+            statuses.update(clockify.status_counts)
+            if clockify.http_cache is not None:
+                cache.update(clockify.http_cache.stats)
+            if clockify.concurrency_limiter is not None:
+                concurrency.append(clockify.concurrency_limiter.stats())
+        dates = sorted({sub_date.isoformat() for sub_date in run_log.dates})
+        with self.transaction() as connection:
+            connection.execute(
+                """
+                INSERT INTO runs (started, duration, mode, user, status, error, dates,
+                    date_count, requests, requests_by_status, throttled, cache_hits,
+                    cache_misses, peak_concurrency, concurrency_limit)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    run_log.started,
+                    time.time() - run_log.started,
+                    run_log.mode,
+                    run_log.user,
+                    "ok" if run_log.error is None else "failed",
+                    None if run_log.error is None else repr(run_log.error),
+                    json.dumps(dates),
+                    len(dates),
+                    sum(statuses.values()),
+                    json.dumps(dict(sorted(statuses.items()))),
+                    statuses.get("429", 0),
+                    cache["fresh"] + cache["revalidated"],
+                    cache["miss"],
+                    max(
+                        (stats["peak_in_flight"] for stats in concurrency), default=None
+                    ),
+                    # the most constrained client of the run
+                    min((stats["limit"] for stats in concurrency), default=None),
+                ),
+            )
+
+    @staticmethod
+    def _where(since=None, status=None, mode=None, slower_than=None, throttled=False):
+        """SQL condition of the filters: runs started since a timestamp, with a status
+        ('ok' or 'failed'), of a mode, taking longer than `slower_than` seconds, or throttled
+        """
+        clauses, params = ["1 = 1"], []
+        for clause, value in (
+            ("started >= ?", since),
+            ("status = ?", status),
+            ("mode = ?", mode),
+            ("duration > ?", slower_than),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if throttled:
+            clauses.append("throttled > 0")
+        return " AND ".join(clauses), params
+
+    def runs(self, limit=20, **filters):
+        """Latest runs matching the filters (see `_where`), newest first
+
+        Returns:
+            runs (list): one dict per run
+        """
+        where, params = self._where(**filters)
+        cursor = self.connection.execute(
+            f"SELECT * FROM runs WHERE {where} ORDER BY started DESC LIMIT ?",
+            params + [limit],
+        )
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def daily(self, **filters):
+        """Aggregates per (local) day of the runs matching the filters, newest day first
+
+        Returns:
+            days (list): dicts of day, runs, failed, mean and max duration, dates submitted,
+                requests, throttled requests and the cache hit rate
+        """
+        where, params = self._where(**filters)
+        cursor = self.connection.execute(
+            f"""
+            SELECT date(started, 'unixepoch', 'localtime') AS day,
+                COUNT(*) AS runs,
+                SUM(status = 'failed') AS failed,
+                AVG(duration) AS mean_duration,
+                MAX(duration) AS max_duration,
+                SUM(date_count) AS dates,
+                SUM(requests) AS requests,
+                SUM(throttled) AS throttled,
+                1.0 * SUM(cache_hits) / MAX(1, SUM(cache_hits + cache_misses)) AS cache_hit_rate
+            FROM runs WHERE {where}
+            GROUP BY day ORDER BY day DESC
+            """,
+            params,
+        )
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def format_history(runs, days):
+    """Human readable lines of the latest runs and the daily aggregates"""
+    lines = [
+        "started              mode      status  duration  dates  requests  429s"
+        "  peak/limit  error"
+    ]
+    for run in runs:
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started"]))
+        concurrency = (
+            "-"
+            if run["peak_concurrency"] is None
+            else f"{run['peak_concurrency']}/{run['concurrency_limit']:g}"
+        )
+        lines.append(
+            f"{started}  {run['mode']:<8}  {run['status']:<6}  {run['duration']:>7.2f}s"
+            f"  {run['date_count']:>5}  {run['requests']:>8}  {run['throttled']:>4}"
+            f"  {concurrency:>10}  {run['error'] or ''}"
+        )
+    lines += [
+        "",
+        "day         runs  failed  mean      max       dates  requests  429s  cache hits",
+    ]
+    for day in days:
+        lines.append(
+            f"{day['day']}  {day['runs']:>4}  {day['failed']:>6}  {day['mean_duration']:>7.2f}s"
+            f"  {day['max_duration']:>7.2f}s  {day['dates']:>5}  {day['requests']:>8}"
+            f"  {day['throttled']:>4}  {day['cache_hit_rate']:>9.0%}"
+        )
+    return lines
@@ -0,0 +1,93 @@
+""" On-disk cache of clockify api GET responses, revalidated with conditional requests """
+import hashlib
+import json
+import time
+from collections import Counter, namedtuple
+from tp_timesheet.config import Config
+from tp_timesheet.ledger import user_key
+from tp_timesheet.store import SQLiteStore
+from tp_timesheet.transport import build_response
+
+CachedResponse = namedtuple("CachedResponse", "etag last_modified body stored")
+
+
+class HTTPCache(SQLiteStore):
+    """Response bodies and their validators (ETag/Last-Modified) of GET requests
+
+    A response younger than `ttl` seconds is reused without asking the api. An older one is
+    revalidated with a conditional request, and a 304 reuses the cached body. Entries are
+    kept per user, keyed on a hash of the api key.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB NOT NULL,
+            stored REAL NOT NULL
+        );
+    """
+
+    def __init__(self, ttl=300, path=None):
+        super().__init__(path or Config.CONFIG_DIR.joinpath("http_cache.sqlite"))
+        self.ttl = ttl
+        # "fresh", "revalidated" and "miss" counts of this process
+        self.stats = Counter()
+
+    @staticmethod
+    def key(api_key, path, params=None):
+        """Cache key of a GET request"""
+        request = json.dumps([user_key(api_key), path, params or {}], sort_keys=True)
+        return hashlib.sha256(request.encode("utf8")).hexdigest()
+
+    def lookup(self, key):
+        """Cached response of a request, None if it was never stored"""
+        row = self.connection.execute(
+            "SELECT etag, last_modified, body, stored FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        return None if row is None else CachedResponse(*row)
+
+    def is_fresh(self, cached):
+        """Whether a cached response can be used without revalidating it"""
+        return time.time() - cached.stored < self.ttl
+
+    @staticmethod
+    def validators(cached):
+        """Headers making a request conditional on the cached response having changed"""
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def store(self, key, response):
+        """Store the body and validators of a successful response"""
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    response.content,
+                    time.time(),
+                ),
+            )
+
+    def refresh(self, key):
+        """Restart the freshness window of a response the api confirmed is unchanged"""
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE responses SET stored = ? WHERE key = ?", (time.time(), key)
+            )
+
+    @staticmethod
+    def to_response(cached, url):
+        """Build a `requests.Response` from a cached response"""
+        headers = {"Content-Type": "application/json"}
+        if cached.etag:
+            headers["ETag"] = cached.etag
+        return build_response(200, cached.body, url, headers)
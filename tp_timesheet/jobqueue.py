@@ -0,0 +1,281 @@
+""" Job queue shared by worker processes, on one host or several hosts sharing a filesystem """
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from tp_timesheet.breaker import CircuitOpenError
+from tp_timesheet.config import Config
+from tp_timesheet.store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+Job = namedtuple("Job", "id user api_key locale date tasks lease_token")
+
+
+class JobQueue(SQLiteStore):
+    """Queue of (user, date) submission jobs kept in a SQLite file
+
+    Workers claim a job with a lease and renew it while they work on the job. A lease that
+    expires (worker died or hung) puts the job back in the queue, and only the holder of the
+    current lease can complete a job, so every job is completed exactly once. Re-enqueueing a
+    (user, date) replaces its tasks.
+
+    NOTE: jobs contain the api key of their user, keep the queue file private.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            api_key TEXT NOT NULL,
+            locale TEXT NOT NULL,
+            date TEXT NOT NULL,
+            tasks TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_token TEXT,
+            lease_expires REAL,
+            error TEXT,
+            completed REAL,
+            UNIQUE (user, date)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, date);
+    """
+
+    def __init__(self, path=None, lease=60, max_attempts=3):
+        super().__init__(path or Config.CONFIG_DIR.joinpath("queue.sqlite"))
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    def enqueue(self, user, api_key, locale, submissions):
+        """Queue (date, task_and_hours) submissions of a user"""
+        with self.transaction() as connection:
+            connection.executemany(
+                """
+                INSERT INTO jobs (user, api_key, locale, date, tasks, status)
+                VALUES (?, ?, ?, ?, ?, 'queued')
+                ON CONFLICT (user, date) DO UPDATE SET
+                    api_key = excluded.api_key, locale = excluded.locale,
+                    tasks = excluded.tasks, status = 'queued', attempts = 0,
+                    lease_token = NULL, lease_expires = NULL, error = NULL, completed = NULL
+                """,
+                [
+                    (user, api_key, locale, sub_date.isoformat(), json.dumps(tasks))
+                    for sub_date, tasks in submissions
+                ],
+            )
+
+    def claim(self):
+        """Lease the next queued job
+
+        Returns:
+            job (Job): the claimed job, None when there is nothing to claim
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            requeued = connection.execute(
+                """
+                UPDATE jobs SET status = 'queued', lease_token = NULL
+                WHERE status = 'claimed' AND lease_expires < ?
+                """,
+                (now,),
+            ).rowcount
+            if requeued:
+                logger.warning("Re-queued %d job(s) with an expired lease", requeued)
+            row = connection.execute(
+                """
+                SELECT id, user, api_key, locale, date, tasks FROM jobs
+                WHERE status = 'queued' ORDER BY date, id LIMIT 1
+                """
+            ).fetchone()
+            if row is None:
+                return None
+            lease_token = uuid.uuid4().hex
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'claimed', lease_token = ?, lease_expires = ?,
+                    attempts = attempts + 1
+                WHERE id = ?
+                """,
+                (lease_token, now + self.lease, row[0]),
+            )
+        job_id, user, api_key, locale, job_date, tasks = row
+        return Job(
+            job_id,
+            user,
+            api_key,
+            locale,
+            date.fromisoformat(job_date),
+            json.loads(tasks),
+            lease_token,
+        )
+
+    def renew(self, job):
+        """Extend the lease of a claimed job by another `lease` seconds
+
+        Returns:
+            True: when the lease is still held
+            False: when the lease was lost, another worker may be working on the job
+        """
+        with self.transaction() as connection:
+            updated = connection.execute(
+                """
+                UPDATE jobs SET lease_expires = ?
+                WHERE id = ? AND status = 'claimed' AND lease_token = ?
+                """,
+                (time.time() + self.lease, job.id, job.lease_token),
+            ).rowcount
+        return updated == 1
+
+    def complete(self, job):
+        """Mark a job as done
+
+        Returns:
+            True: when the job was completed by this call
+            False: when the lease was lost, the job is (or will be) handled by another worker
+        """
+        with self.transaction() as connection:
+            updated = connection.execute(
+                """
+                UPDATE jobs SET status = 'done', completed = ?, lease_token = NULL
+                WHERE id = ? AND status = 'claimed' AND lease_token = ?
+                """,
+                (time.time(), job.id, job.lease_token),
+            ).rowcount
+        return updated == 1
+
+    def fail(self, job, error):
+        """Put a failed job back in the queue, or give up after `max_attempts`"""
+        with self.transaction() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET error = ?, lease_token = NULL,
+                    status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END
+                WHERE id = ? AND status = 'claimed' AND lease_token = ?
+                """,
+                (str(error), self.max_attempts, job.id, job.lease_token),
+            )
+
+    def release(self, job):
+        """Put a claimed job back in the queue without counting the attempt"""
+        with self.transaction() as connection:
+            connection.execute(
+                """
+                UPDATE jobs SET status = 'queued', lease_token = NULL, attempts = attempts - 1
+                WHERE id = ? AND status = 'claimed' AND lease_token = ?
+                """,
+                (job.id, job.lease_token),
+            )
+
+    def counts(self):
+        """Number of jobs per status"""
+        rows = self.connection.execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall()
+        return dict(rows)
+
+
+def work(job_queue, clockify_factory, workers=1, poll=1.0, ledger=None):
+    """Submit jobs from the queue until it is drained
+
+    Every job is planned and submitted like a run of the cli (see `Clockify.submit_all`), so
+    an unknown task, project or tag fails the job before its date is touched.
+
+    Args:
+        job_queue (JobQueue): queue to take the jobs from
+        clockify_factory (callable): creates a `Clockify` from an (api_key, locale) pair
+        workers (int): number of jobs worked on concurrently by this process
+        poll (float): seconds to wait for jobs leased by other workers to finish or expire
+        ledger (SubmissionLedger): records the submitted dates when given
+
+    Returns:
+        completed (int): number of jobs completed by this process
+
+    While the circuit breaker is open the claimed jobs are released and the workers stop, the
+    queue is left for a later run once the api has recovered. The leases of the jobs in
+    progress are renewed every third of a lease, so a job slowed down by rate limits or
+    timeouts is not handed to a second worker while this one is still writing.
+    """
+    clockify_objects = {}
+    clockify_lock = threading.Lock()
+    # job id -> job, of the jobs whose lease is being renewed
+    in_progress = {}
+    progress_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def keep_leases():
+        while not stopped.wait(job_queue.lease / 3):
+            with progress_lock:
+                jobs = list(in_progress.values())
+            for job in jobs:
+                if not job_queue.renew(job):
+                    logger.warning("Lease on %s (%s) was lost", job.date, job.user)
+                    with progress_lock:
+                        in_progress.pop(job.id, None)
+
+    def on_submitted(job):
+        def record(sub_date, task_and_hours, entry_ids):
+            if ledger is not None:
+                plan = ledger.plan_hash(task_and_hours, job.locale)
+                ledger.record(job.user, sub_date, plan, entry_ids)
+
+        return record
+
+    def clockify(api_key, locale):
+        with clockify_lock:
+            if (api_key, locale) not in clockify_objects:
+                clockify_objects[(api_key, locale)] = clockify_factory(api_key, locale)
+            return clockify_objects[(api_key, locale)]
+
+    def work_loop():
+        completed = 0
+        while True:
+            job = job_queue.claim()
+            if job is None:
+                if not job_queue.counts().get("claimed"):
+                    return completed
+                time.sleep(poll)
+                continue
+            with progress_lock:
+                in_progress[job.id] = job
+            try:
+                submitter = clockify(job.api_key, job.locale)
+                submissions = [(job.date, job.tasks)]
+                planned = submitter.plan(submissions)
+                # The lease may have expired while the metadata was resolved
+                if not job_queue.renew(job):
+                    logger.warning("Lease on %s (%s) was lost", job.date, job.user)
+                    continue
+                submitter.submit_all(
+                    submissions, planned=planned, on_submitted=on_submitted(job)
+                )
+            except CircuitOpenError as error:
+                logger.warning("Stopping, %s", error)
+                job_queue.release(job)
+                return completed
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Job %s (%s) failed: %s", job.date, job.user, error)
+                job_queue.fail(job, error)
+                continue
+            finally:
+                with progress_lock:
+                    in_progress.pop(job.id, None)
+            if job_queue.complete(job):
+                completed += 1
+                logger.info("Submitted %s for %s", job.date, job.user)
+            else:
+                logger.warning("Lease on %s (%s) was lost", job.date, job.user)
+
+    lease_keeper = threading.Thread(target=keep_leases, daemon=True)
+    lease_keeper.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = [executor.submit(work_loop) for _ in range(max(1, workers))]
+    finally:
+        stopped.set()
+        lease_keeper.join()
+    return sum(result.result() for result in results)
@@ -0,0 +1,128 @@
+""" Checkpoint journals so that interrupted multi-date submissions can be resumed """
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import date
+from pathlib import Path
+from tp_timesheet.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Per-date checkpoint journal of a submission run.
+
+    The journal is written before the first submission and every date is checkpointed as soon
+    as it has been submitted, so a run that dies part way through can be continued with
+    `--resume` without resubmitting the dates that already made it to clockify.
+
+    Every run has its own journal file in `directory`, a new run does not discard the journal
+    of an earlier interrupted run. Only the dates the new run submits again are removed from
+    it, so a later `--resume` cannot overwrite them with the older tasks.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or Config.CONFIG_DIR.joinpath("journals"))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Named by start time, so sorting the names sorts the runs
+        self.path = self.directory.joinpath(
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.json"
+        )
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def begin(self, submissions):
+        """Start the journal of this run for a list of (date, task_and_hours) submissions"""
+        dates = {sub_date.isoformat() for sub_date, _ in submissions}
+        for path in self.interrupted():
+            entries = self._read(path)
+            left = [entry for entry in entries if entry["date"] not in dates]
+            if len(left) < len(entries):
+                logger.info(
+                    "Date(s) %s of an interrupted run are submitted by this run",
+                    sorted({entry["date"] for entry in entries} & dates),
+                )
+                self._write(left, path)
+            if any(not entry["done"] for entry in left):
+                logger.warning(
+                    "An interrupted run still has %d date(s) to submit, "
+                    "run `tp-timesheet --resume` to finish it",
+                    sum(not entry["done"] for entry in left),
+                )
+            else:
+                os.remove(path)
+        self.entries = [
+            {"date": sub_date.isoformat(), "tasks": tasks, "done": False}
+            for sub_date, tasks in submissions
+        ]
+        self._write(self.entries)
+
+    def interrupted(self):
+        """Journals of other runs with unfinished dates, oldest first"""
+        return [
+            path
+            for path in sorted(self.directory.glob("*.json"))
+            if path != self.path
+            and any(not entry["done"] for entry in self._read(path))
+        ]
+
+    def load(self):
+        """Load the journal of the oldest interrupted run, to resume it
+
+        Returns:
+            True: when a journal with unfinished dates was found
+            False: when there is nothing to resume
+        """
+        interrupted = self.interrupted()
+        if not interrupted:
+            return False
+        if len(interrupted) > 1:
+            logger.info(
+                "%d more interrupted run(s), resume again to finish them",
+                len(interrupted) - 1,
+            )
+        self.path = interrupted[0]
+        self.entries = self._read(self.path)
+        return True
+
+    def pending(self):
+        """List of (date, task_and_hours) submissions that have not completed yet"""
+        return [
+            (date.fromisoformat(entry["date"]), entry["tasks"])
+            for entry in self.entries
+            if not entry["done"]
+        ]
+
+    def mark_done(self, sub_date):
+        """Checkpoint a date as successfully submitted, dates may complete concurrently"""
+        with self._lock:
+            for entry in self.entries:
+                if entry["date"] == sub_date.isoformat():
+                    entry["done"] = True
+            self._write(self.entries)
+
+    def finish(self):
+        """Remove the journal once every date has been submitted"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.entries = []
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r", encoding="utf8") as journal_file:
+                return json.load(journal_file)
+        except FileNotFoundError:
+            # Finished by its run in the meantime
+            return []
+
+    def _write(self, entries, path=None):
+        """Atomically persist a journal, a crash mid-write must not corrupt the checkpoint"""
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as journal_file:
+            json.dump(entries, journal_file, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,55 @@
+""" Local ledger of successfully submitted dates, allowing runs to skip dates already submitted """
+import hashlib
+import json
+import time
+from tp_timesheet.config import Config
+from tp_timesheet.store import SQLiteStore
+
+
+def user_key(api_key):
+    """Identifier of a user that can be stored without storing their api key"""
+    return hashlib.sha256(api_key.encode("utf8")).hexdigest()[:12]
+
+
+class SubmissionLedger(SQLiteStore):
+    """Record of the plan (tasks and locale) last submitted for every (user, date)
+
+    Looking up a date needs no network access and no http libraries, so a scheduled run for
+    a date that was already submitted with the same plan can exit straight away.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS submissions (
+            user TEXT NOT NULL,
+            date TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            entry_ids TEXT NOT NULL,
+            submitted REAL NOT NULL,
+            PRIMARY KEY (user, date)
+        );
+    """
+
+    def __init__(self, path=None):
+        super().__init__(path or Config.CONFIG_DIR.joinpath("ledger.sqlite"))
+
+    @staticmethod
+    def plan_hash(task_and_hours, locale):
+        """Hash of everything that determines the time entries of a date"""
+        plan = json.dumps({"tasks": task_and_hours, "locale": locale}, sort_keys=True)
+        return hashlib.sha256(plan.encode("utf8")).hexdigest()
+
+    def record(self, user, sub_date, plan, entry_ids):
+        """Record a successful submission"""
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?)",
+                (user, sub_date.isoformat(), plan, json.dumps(entry_ids), time.time()),
+            )
+
+    def submitted(self, user, sub_date, plan):
+        """Entry ids of the submission of a date with the same plan, None if there is none"""
+        row = self.connection.execute(
+            "SELECT entry_ids FROM submissions WHERE user = ? AND date = ? AND plan = ?",
+            (user, sub_date.isoformat(), plan),
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
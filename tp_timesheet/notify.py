@@ -0,0 +1,159 @@
+""" Desktop notifications of a run, shown without ever blocking the run or its exit """
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+TITLE = "TP Timesheet"
+
+logger = logging.getLogger(__name__)
+
+
+def applescript_string(text):
+    """Quote text as an AppleScript string literal"""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class OsascriptBackend:
+    """Notification center on OSX, failures are shown as a dialog that gives up by itself"""
+
+    name = "osascript"
+
+    @staticmethod
+    def available():
+        """Whether notifications can be shown with this backend"""
+        return sys.platform == "darwin" and shutil.which("osascript") is not None
+
+    @staticmethod
+    def command(message, urgent, timeout):
+        """Command showing a notification, None when there is nothing to run"""
+        if urgent:
+            script = (
+                f"display dialog {applescript_string(message)} with title "
+                f'{applescript_string(TITLE)} buttons {{"OK"}} default button "OK" '
+                f"with icon 2 giving up after {max(1, int(timeout))}"
+            )
+        else:
+            script = (
+                f"display notification {applescript_string(message)} with title "
+                f"{applescript_string(TITLE)}"
+            )
+        return ["osascript", "-e", script]
+
+
+class NotifySendBackend:
+    """Freedesktop notifications over D-Bus, only available within a desktop session"""
+
+    name = "notify-send"
+
+    @staticmethod
+    def available():
+        """Whether notifications can be shown with this backend"""
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+        has_bus = "DBUS_SESSION_BUS_ADDRESS" in os.environ or (
+            runtime_dir is not None and os.path.exists(os.path.join(runtime_dir, "bus"))
+        )
+        return has_bus and shutil.which("notify-send") is not None
+
+    @staticmethod
+    def command(message, urgent, timeout):
+        """Command showing a notification, None when there is nothing to run"""
+        return [
+            "notify-send",
+            f"--app-name={TITLE}",
+            f"--urgency={'critical' if urgent else 'normal'}",
+            f"--expire-time={int(timeout * 1000)}",
+            TITLE,
+            message,
+        ]
+
+
+class LogBackend:
+    """Notifications are only logged, used when no desktop is reachable (eg. cron runs)"""
+
+    name = "log"
+
+    @staticmethod
+    def available():
+        """Whether notifications can be shown with this backend"""
+        return True
+
+    @staticmethod
+    def command(message, urgent, timeout):  # pylint: disable=unused-argument
+        """Command showing a notification, None when there is nothing to run"""
+        logger.log(logging.WARNING if urgent else logging.INFO, message)
+
+
+# Backends by name, "auto" picks the first available one in this order
+BACKENDS = {
+    backend.name: backend
+    for backend in (OsascriptBackend, NotifySendBackend, LogBackend)
+}
+
+
+def select_backend(name="auto"):
+    """Notification backend of a name from `BACKENDS`, or the first available one for "auto" """
+    if name == "auto":
+        return next(backend for backend in BACKENDS.values() if backend.available())
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown notification backend '{name}', choose from {['auto', *BACKENDS]}"
+        )
+    return BACKENDS[name]
+
+
+class Notifier:  # pylint: disable=too-few-public-methods
+    """Shows notifications through a backend without waiting for them
+
+    The notification process is started and left running, a daemon thread kills it after
+    `timeout` seconds so a dialog nobody dismisses does not linger. Neither the run nor the
+    exit of the process wait for the notification.
+    """
+
+    def __init__(self, backend="auto", timeout=10):
+        self.backend = select_backend(backend)
+        self.timeout = timeout
+
+    def notify(self, message, urgent=False):
+        """Show a notification, `urgent` ones are for failures
+
+        Returns:
+            process (subprocess.Popen): notification process, None when nothing was started
+        """
+        command = self.backend.command(message, urgent, self.timeout)
+        if command is None:
+            return None
+        try:
+            # pylint: disable=consider-using-with
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except OSError as error:
+            logger.warning("Could not show notification (%s): %s", error, message)
+            return None
+        threading.Thread(
+            target=self._reap, args=(process,), name="notify", daemon=True
+        ).start()
+        return process
+
+    def _reap(self, process):
+        try:
+            process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            logger.debug(
+                "Notification still showing after %ss, closing it", self.timeout
+            )
+            process.kill()
+            process.wait()
+        if process.returncode:
+            logger.debug(
+                "Notification with %s exited with %s",
+                self.backend.name,
+                process.returncode,
+            )
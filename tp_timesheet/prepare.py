@@ -0,0 +1,97 @@
+""" Ahead of time preparation of the time entries for upcoming scheduled runs """
+import hashlib
+import json
+import logging
+import os
+from datetime import date
+from tp_timesheet.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedRuns:
+    """Store of workspace metadata and time entry POST bodies built ahead of scheduled runs.
+
+    A scheduled run that finds its date prepared only has to send the stored requests, the
+    /user, /tags, /projects and /tasks lookups have already been done by a previous run.
+    Prepared data is only used with the api key and locale it was built for.
+    """
+
+    def __init__(self, api_key, locale, path=None):
+        self.path = path or Config.CONFIG_DIR.joinpath("prepared.json")
+        self.key = hashlib.sha256(f"{api_key}:{locale}".encode("utf8")).hexdigest()
+        self.metadata = None
+        self.runs = {}
+
+    def load(self):
+        """Load the prepared runs from today onwards
+
+        Returns:
+            True: when prepared data exists for this api key and locale
+            False: when nothing usable was prepared
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf8") as prepared_file:
+            prepared = json.load(prepared_file)
+        if prepared.get("key") != self.key:
+            logger.debug("Prepared runs belong to another api key or locale, ignoring")
+            return False
+        today = date.today().isoformat()
+        self.metadata = prepared["metadata"]
+        self.runs = {
+            run_date: run
+            for run_date, run in prepared["runs"].items()
+            if run_date >= today
+        }
+        return True
+
+    def apply(self, clockify):
+        """Hand the prepared time entries over to a clockify object"""
+        for run_date, run in self.runs.items():
+            prepared_key = (
+                date.fromisoformat(run_date),
+                json.dumps(run["tasks"], sort_keys=True),
+            )
+            clockify.prepared_entries[prepared_key] = run["entries"]
+
+    def prepare(self, clockify, submissions):
+        """Build, validate and store the time entries of (date, task_and_hours) submissions"""
+        # Always rebuild, previously prepared entries may be stale
+        clockify.prepared_entries.clear()
+        self.metadata = clockify.metadata
+        for sub_date, task_and_hours in submissions:
+            entries = clockify.build_time_entries(sub_date, task_and_hours)
+            self.validate(entries, task_and_hours)
+            self.runs[sub_date.isoformat()] = {
+                "tasks": task_and_hours,
+                "entries": entries,
+            }
+        self._write()
+        logger.info(
+            "Prepared time entries for the upcoming runs on: %s",
+            [sub_date for sub_date, _ in submissions],
+        )
+
+    @staticmethod
+    def validate(entries, task_and_hours):
+        """Check built time entries are complete, raises ValueError otherwise"""
+        if len(entries) != len(task_and_hours):
+            raise ValueError(f"Expected {len(task_and_hours)} entries, got {entries}")
+        for entry in entries:
+            required = ("start", "end", "projectId", "taskId", "tagIds")
+            if not all(entry.get(field) for field in required):
+                raise ValueError(f"Incomplete time entry: {entry}")
+            if entry["start"] >= entry["end"]:
+                raise ValueError(f"Time entry ends before it starts: {entry}")
+
+    def _write(self):
+        """Atomically persist the prepared runs"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as prepared_file:
+            json.dump(
+                {"key": self.key, "metadata": self.metadata, "runs": self.runs},
+                prepared_file,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
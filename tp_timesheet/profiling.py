@@ -0,0 +1,108 @@
+""" CPU and memory profiling of a whole run, enabled with --profile """
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Context manager profiling everything run inside it, in every thread
+
+    Three files are written to `directory`, named after the start time of the run:
+      *.pstats: cProfile statistics of every thread started inside it, merged with the ones of
+        the calling thread, eg) for `python -m pstats` or snakeviz
+      *.collapsed: stacks of all threads sampled every `interval` seconds, one
+        "frame;frame;frame count" line per stack, ready for flamegraph.pl or speedscope
+      *.alloc.txt: the `top` source lines allocating the most memory that is still held,
+        and the peak traced memory
+    """
+
+    def __init__(self, directory, interval=0.005, top=25):
+        self.directory = directory
+        self.interval = interval
+        self.top = top
+        self.stacks = Counter()
+        self.paths = {}
+        self._profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        tracemalloc.start()
+        self._sampler.start()
+        threading.setprofile(self._profile_thread)
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *_):
+        self._profile.disable()
+        threading.setprofile(None)
+        self._stop.set()
+        self._sampler.join()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.join(self.directory, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self.paths = {
+            "pstats": f"{stem}.pstats",
+            "collapsed": f"{stem}.collapsed",
+            "alloc": f"{stem}.alloc.txt",
+        }
+        stats = pstats.Stats(self._profile)
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+        stats.dump_stats(self.paths["pstats"])
+        with open(self.paths["collapsed"], "w", encoding="utf8") as collapsed_file:
+            for stack, count in self.stacks.most_common():
+                collapsed_file.write(f"{stack} {count}\n")
+        with open(self.paths["alloc"], "w", encoding="utf8") as alloc_file:
+            alloc_file.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+            alloc_file.write(f"Top {self.top} allocating lines (still held):\n")
+            for stat in snapshot.statistics("lineno")[: self.top]:
+                alloc_file.write(f"{stat}\n")
+        logger.info("Profiles written to: %s", ", ".join(self.paths.values()))
+
+    def _profile_thread(self, *_):
+        """Profile a thread started while profiling, called on its first event"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python >= 3.12 profiles every thread with the profile of the calling thread
+            sys.setprofile(None)
+            return
+        with self._lock:
+            self._thread_profiles.append(profile)
+
+    def _sample(self):
+        """Record the stack of every other thread until stopped"""
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            # pylint: disable=protected-access
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.stacks[self.collapse(frame)] += 1
+
+    @staticmethod
+    def collapse(frame):
+        """Collapsed representation of a stack, outermost frame first"""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(frames))
@@ -0,0 +1,68 @@
+""" Request budget shared by every tp-timesheet process on a host """
+import logging
+import time
+from tp_timesheet.config import Config
+from tp_timesheet.store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRateLimiter(SQLiteStore):
+    """Token bucket kept in a SQLite file, so that the combined request rate of all local
+    processes (cron jobs of several users, manual backfills, CI jobs) stays under the limit.
+
+    Args:
+        rate (float): requests per second allowed across all processes
+        burst (float): bucket size, defaults to one second worth of requests
+        name (str): name of the bucket, processes drawing from the same name share it
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS buckets (
+            name TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL
+        );
+    """
+
+    def __init__(self, rate, burst=None, name="clockify", path=None):
+        super().__init__(path or Config.CONFIG_DIR.joinpath("ratelimit.sqlite"))
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.name = name
+
+    def acquire(self):
+        """Take one request from the budget, blocks until one is available
+
+        Returns:
+            waited (float): seconds spent waiting for the budget
+        """
+        waited = 0.0
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                if waited:
+                    logger.debug("Waited %.3fs for the shared rate limit", waited)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def _take(self):
+        """Try to take a token, returns 0 on success or the seconds until one is available"""
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+        return wait
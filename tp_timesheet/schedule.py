@@ -1,22 +1,78 @@
 """ Automated cron scheduler for daily submissions """
+import hashlib
 import os
 import sysconfig
 import sys
 import logging
 from datetime import datetime
+from croniter import croniter
 from crontab import CronTab
 
 TP_BIN = "tp-timesheet"
 SYS_PATH = os.environ.get("PATH")
+# Comment marking the job in the crontab, so scheduling again replaces it
+CRON_COMMENT = "tp-timesheet automated submission"
 
 logger = logging.getLogger(__name__)
 
 
 class ScheduleForm:
-    """Cron Schedule Handler"""
+    """Cron Schedule Handler
 
-    def __init__(self):
-        self.executable = self.find_executable_location()
+    Every user runs at their own time within `window` ("HH:MM-HH:MM"), so a team does not hit
+    the api at the same second. The time is derived from a hash of the user, it stays the same
+    every time the job is scheduled and users are spread evenly over the window.
+
+    Args:
+        window (str): eg) "09:00-10:00", runs at exactly 09:30 when not given
+        user (str): identifier of the user (see `tp_timesheet.ledger.user_key`)
+    """
+
+    cron_minute = 30
+    cron_hour = 9
+    cron_dow = "MON-FRI"
+
+    def __init__(self, window=None, user=None):
+        self.delay = 0
+        if window:
+            start, length = self.parse_window(window)
+            offset = self.jitter(user or "", length * 60)
+            minutes = start + offset // 60
+            self.cron_hour, self.cron_minute = divmod(minutes, 60)
+            # Seconds past the minute, cron itself only has minutes
+            self.delay = offset % 60
+
+    @staticmethod
+    def parse_window(window):
+        """Parse a "HH:MM-HH:MM" window within a day
+
+        Returns:
+            start (int): minutes from midnight
+            length (int): minutes, 0 for a window of a single minute
+        """
+        try:
+            start, end = (
+                datetime.strptime(bound.strip(), "%H:%M") for bound in window.split("-")
+            )
+        except ValueError as error:
+            raise ValueError(
+                f"Invalid schedule window '{window}', expected eg) '09:00-10:00'"
+            ) from error
+        start_minutes = start.hour * 60 + start.minute
+        end_minutes = end.hour * 60 + end.minute
+        if end_minutes < start_minutes:
+            raise ValueError(
+                f"Invalid schedule window '{window}', it must end after it starts"
+            )
+        return start_minutes, end_minutes - start_minutes
+
+    @staticmethod
+    def jitter(user, seconds):
+        """Deterministic offset of a user within a number of seconds, uniformly distributed"""
+        if seconds <= 0:
+            return 0
+        digest = hashlib.sha256(f"{TP_BIN}:{user}".encode("utf8")).digest()
+        return int.from_bytes(digest[:8], "big") % seconds
 
     @staticmethod
     def find_executable_location():
@@ -56,15 +112,10 @@ cannot be found in: {sysconfig_scripts_path}"
         )
 
     def schedule(self):
-        """Create the crontab schedule"""
+        """Create the crontab schedule, replacing the job scheduled before if there is one"""
+        executable = self.find_executable_location()
         with CronTab(user=True) as cron:
-            job = cron.new(
-                command=f"PATH='{SYS_PATH}' {self.executable} --start today --count 1 --notification"
-            )
-            job.minute.parse(30)
-            job.hour.parse(9)
-            job.dow.parse("MON-FRI")
-            assert job.is_valid()
+            job = self.install(cron, executable)
             cron_schedule = job.schedule(date_from=datetime.now())
         logger.info(
             "Job has been scheduled in your crontab, the next scheduled run will be on %s.",
@@ -73,6 +124,40 @@ cannot be found in: {sysconfig_scripts_path}"
         logger.info("Run `crontab -l` to see your scheduled tasks.")
         logger.info("Run `crontab -r` to clear all scheduled tasks.")
 
+    def install(self, cron, executable):
+        """Add the job to a crontab, removing the jobs this tool added before
+
+        Jobs are found by their comment, jobs scheduled before the comment was added are found
+        by their command.
+
+        Returns:
+            job (crontab.CronItem): the new job
+        """
+        for job in list(cron):
+            legacy = not job.comment and f"{TP_BIN} --start today" in job.command
+            if job.comment == CRON_COMMENT or legacy:
+                cron.remove(job)
+        command = (
+            f"PATH='{SYS_PATH}' {executable} --start today --count 1 "
+            + "--notification --skip-submitted --prepare"
+        )
+        if self.delay:
+            command = f"sleep {self.delay} && {command}"
+        job = cron.new(command=command, comment=CRON_COMMENT)
+        job.minute.parse(self.cron_minute)
+        job.hour.parse(self.cron_hour)
+        job.dow.parse(self.cron_dow)
+        assert job.is_valid()
+        return job
+
+    def next_run_dates(self, count, date_from=None):
+        """Dates of the next `count` scheduled runs after `date_from` (default: now)"""
+        cron_schedule = croniter(
+            f"{self.cron_minute} {self.cron_hour} * * {self.cron_dow}",
+            date_from or datetime.now(),
+        )
+        return [cron_schedule.get_next(datetime).date() for _ in range(count)]
+
 
 if __name__ == "__main__":
     # Executable for debugging purposes
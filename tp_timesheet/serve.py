@@ -0,0 +1,332 @@
+""" Local http api for other tools to submit timesheets through one warm, batching process """
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from workalendar.asia import Singapore
+from tp_timesheet.config import Config
+from tp_timesheet.date_utils import get_working_dates, is_beyond_range
+from tp_timesheet.ledger import user_key
+
+logger = logging.getLogger(__name__)
+# Most days a single request can submit, a year
+MAX_COUNT = 366
+
+
+def load_token(path=None):
+    """Token the http api is called with, created on first use and readable by its owner only
+
+    Other accounts of a shared host cannot read it, so they cannot submit with the owner's key.
+    """
+    path = path or Config.CONFIG_DIR.joinpath("serve.token")
+    try:
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, "r", encoding="utf8") as token_file:
+            return token_file.read().strip()
+    token = secrets.token_urlsafe(32)
+    with os.fdopen(descriptor, "w", encoding="utf8") as token_file:
+        token_file.write(token)
+    return token
+
+
+class Batcher:
+    """Coalesces submissions arriving within `window` seconds into one batch
+
+    Submissions of a batch are grouped per user, a (user, date) submitted more than once in the
+    window is only sent once with its latest tasks. Users are submitted concurrently, each with
+    up to `workers` dates in flight, by `Clockify` objects kept warm between batches.
+
+    Args:
+        clockify_factory (callable): creates a `Clockify` from an (api_key, locale) pair
+        ledger (SubmissionLedger): records the submitted dates when given
+        status_ttl (float): seconds the status of a finished submission is kept
+    """
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(
+        self, clockify_factory, window=0.05, workers=4, ledger=None, status_ttl=3600
+    ):
+        self.clockify_factory = clockify_factory
+        self.window = window
+        self.workers = workers
+        self.ledger = ledger
+        self.status_ttl = status_ttl
+        self.clockify_pool = {}
+        self.statuses = {}
+        # submission id -> time it finished, its status is evicted `status_ttl` later
+        self._finished = {}
+        self.batches = 0
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="batch")
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def clockify(self, api_key, locale):
+        """Warm `Clockify` object of a user, created on first use"""
+        with self._lock:
+            if (api_key, locale) not in self.clockify_pool:
+                self.clockify_pool[(api_key, locale)] = self.clockify_factory(
+                    api_key, locale
+                )
+            return self.clockify_pool[(api_key, locale)]
+
+    def submit(self, api_key, locale, submissions):
+        """Queue (date, task_and_hours) submissions of a user
+
+        Returns:
+            submission_id (str): identifier to look up the status with
+        """
+        submission_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._evict()
+            self.statuses[submission_id] = {
+                "id": submission_id,
+                "status": "queued",
+                "dates": {
+                    sub_date.isoformat(): "queued" for sub_date, _ in submissions
+                },
+            }
+        self._pending.put((submission_id, api_key, locale, submissions))
+        return submission_id
+
+    def status(self, submission_id):
+        """Status of a submission, None when the id is unknown"""
+        with self._lock:
+            self._evict()
+            status = self.statuses.get(submission_id)
+            return None if status is None else json.loads(json.dumps(status))
+
+    def _evict(self):
+        """Forget the submissions that finished more than `status_ttl` seconds ago"""
+        expired = time.monotonic() - self.status_ttl
+        for submission_id, finished in list(self._finished.items()):
+            if finished < expired:
+                del self._finished[submission_id]
+                del self.statuses[submission_id]
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.window
+            while time.monotonic() < deadline:
+                try:
+                    batch.append(self._pending.get(timeout=deadline - time.monotonic()))
+                except (queue.Empty, ValueError):
+                    break
+            self.batches += 1
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """Group a batch per user and submit every user concurrently"""
+        groups = {}
+        for submission_id, api_key, locale, submissions in batch:
+            dates = groups.setdefault((api_key, locale), {})
+            for sub_date, tasks in submissions:
+                _, submission_ids = dates.get(sub_date, (None, []))
+                dates[sub_date] = (tasks, submission_ids + [submission_id])
+        logger.info(
+            "Submitting a batch of %d request(s) for %d user(s)",
+            len(batch),
+            len(groups),
+        )
+        for (api_key, locale), dates in groups.items():
+            self._executor.submit(self._submit_user, api_key, locale, dates)
+
+    def _submit_user(self, api_key, locale, dates):
+        def on_submitted(sub_date, task_and_hours, entry_ids):
+            self._set_status(dates[sub_date][1], sub_date, "submitted")
+            if self.ledger is not None:
+                plan = self.ledger.plan_hash(task_and_hours, locale)
+                self.ledger.record(user_key(api_key), sub_date, plan, entry_ids)
+
+        try:
+            self.clockify(api_key, locale).submit_all(
+                [(sub_date, tasks) for sub_date, (tasks, _) in sorted(dates.items())],
+                workers=self.workers,
+                on_submitted=on_submitted,
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error(
+                "Batched submission for %s failed: %s", user_key(api_key), error
+            )
+            for sub_date, (_, submission_ids) in dates.items():
+                self._set_status(submission_ids, sub_date, "failed", error)
+
+    def _set_status(self, submission_ids, sub_date, date_status, error=None):
+        with self._lock:
+            for submission_id in submission_ids:
+                status = self.statuses.get(submission_id)
+                if status is None or status["dates"][sub_date.isoformat()] != "queued":
+                    continue
+                status["dates"][sub_date.isoformat()] = date_status
+                if error is not None:
+                    status["error"] = str(error)
+                if "failed" in status["dates"].values():
+                    status["status"] = "failed"
+                elif "queued" not in status["dates"].values():
+                    status["status"] = "submitted"
+                if "queued" not in status["dates"].values():
+                    self._finished.setdefault(submission_id, time.monotonic())
+
+
+class SubmissionHandler(BaseHTTPRequestHandler):
+    """Http api of serve mode
+
+    POST /submissions  {"start": "2022-08-08", "count": 1, "tasks": {"live": 8}} queues the
+        working dates (and holidays) like the cli does, optional "api_key" and "locale"
+        default to the ones of the config file. Answers 202 with the submission id, or 400
+        when the request is not a valid submission.
+    GET /submissions/<id>  status of a submission, per date
+
+    Every request must carry the token of the server (see `load_token`) in an
+    "Authorization: Bearer <token>" header, others are answered with a 401.
+    """
+
+    server_version = "tp-timesheet"
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Queue a submission"""
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") != "/submissions":
+            self._reply(404, {"message": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            submissions = self.server.plan(request)
+        except (ValueError, KeyError, TypeError) as error:
+            self._reply(400, {"message": str(error)})
+            return
+        submission_id = self.server.batcher.submit(
+            request.get("api_key", self.server.api_key),
+            request.get("locale", self.server.locale),
+            submissions,
+        )
+        self._reply(202, self.server.batcher.status(submission_id))
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Status of a submission"""
+        if not self._authorized():
+            return
+        prefix = "/submissions/"
+        status = None
+        if self.path.startswith(prefix):
+            status = self.server.batcher.status(self.path[len(prefix) :])
+        if status is None:
+            self._reply(404, {"message": "Not found"})
+        else:
+            self._reply(200, status)
+
+    def _authorized(self):
+        """Check the request carries the server's token, answers 401 when it does not"""
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        if scheme == "Bearer" and hmac.compare_digest(
+            token.encode("utf8"), self.server.token.encode("utf8")
+        ):
+            return True
+        self._reply(401, {"message": "Unauthorized"})
+        return False
+
+    def _reply(self, status_code, body):
+        content = json.dumps(body).encode("utf8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class SubmissionServer(ThreadingHTTPServer):
+    """Http server of serve mode, only listens on the loopback interface
+
+    Args:
+        token (str): token every request must carry, see `load_token`
+        sanity_check_range (int): days from today a start date may be, like the start date
+            sanity check of the cli. There is nobody to confirm other dates, they are rejected.
+            None accepts any start date
+    """
+
+    daemon_threads = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        batcher,
+        api_key,
+        locale,
+        token,
+        port=8787,
+        task_names=None,
+        sanity_check_range=None,
+    ):
+        super().__init__(("127.0.0.1", port), SubmissionHandler)
+        self.batcher = batcher
+        self.api_key = api_key
+        self.locale = locale
+        self.token = token
+        self.task_names = task_names
+        self.sanity_check_range = sanity_check_range
+        self.cal = Singapore()
+
+    def plan(self, request):
+        """(date, task_and_hours) submissions of a POST /submissions request
+
+        Raises:
+            ValueError: when the request is not a valid submission
+        """
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a json object")
+        for field in ("api_key", "locale"):
+            if not isinstance(request.get(field, ""), str):
+                raise ValueError(f"'{field}' must be a string")
+        locale = request.get("locale", self.locale)
+        if not Config.is_valid_locale(locale):
+            raise ValueError(f"Unknown locale: {locale}")
+        tasks = request.get("tasks")
+        if not isinstance(tasks, dict) or not tasks:
+            raise ValueError("'tasks' must be an object of task names and hours")
+        unknown = set(tasks) - set(self.task_names or tasks)
+        if unknown:
+            raise ValueError(f"Unknown task(s): {sorted(unknown)}")
+        for task, hours in tasks.items():
+            # bool is an int too, but `true` hours is a mistake
+            if not isinstance(hours, int) or isinstance(hours, bool) or hours < 0:
+                raise ValueError(f"The hours of '{task}' must be a whole number >= 0")
+        if sum(tasks.values()) != 8:
+            raise ValueError(
+                f"The hours must add up to 8. (Given: {sum(tasks.values())} hours)"
+            )
+        count = request.get("count", 1)
+        if not isinstance(count, int) or isinstance(count, bool):
+            raise ValueError("'count' must be a whole number")
+        if not 1 <= count <= MAX_COUNT:
+            raise ValueError(f"'count' must be between 1 and {MAX_COUNT}")
+        if not isinstance(request.get("start"), str):
+            raise ValueError("'start' must be an ISO date, e.g. 2022-08-08")
+        start = date.fromisoformat(request["start"])
+        if self.sanity_check_range is not None and is_beyond_range(
+            start, self.sanity_check_range
+        ):
+            raise ValueError(
+                f"The start date {start} is beyond the maximum "
+                f"{self.sanity_check_range} day window from today"
+            )
+        working_dates, holidays = get_working_dates(
+            start=start, count=count, cal=self.cal
+        )
+        return [(sub_date, tasks) for sub_date in working_dates] + [
+            (sub_date, {"holiday": 8}) for sub_date in holidays
+        ]
@@ -0,0 +1,352 @@
+""" In-process simulation of submissions against a fake clockify api, used for capacity planning """
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+import requests
+from tp_timesheet.clockify_timesheet import Clockify
+from tp_timesheet.config import Config
+from tp_timesheet.date_utils import get_working_dates
+from tp_timesheet.transport import build_response
+
+logger = logging.getLogger(__name__)
+
+
+def build_json_response(status_code, body, url, headers=None):
+    """Build a `requests.Response` as if it had been received from the api"""
+    return build_response(
+        status_code,
+        b"" if body is None else json.dumps(body).encode("utf8"),
+        url,
+        {"Content-Type": "application/json", **(headers or {})},
+    )
+
+
+class FakeClockifyAPI:  # pylint: disable=too-few-public-methods
+    """Session compatible, in-process fake of the parts of the clockify api used by `Clockify`
+
+    Every request sleeps for `latency` seconds scaled by `time_scale` and is logged with its
+    (scaled back) start and end time, so request counts and concurrency can be measured.
+    Every user (api key) has their own time entries, the first time a day is fetched it is
+    seeded with `existing_entries` entries so the delete phase is exercised too. Metadata
+    responses carry an ETag and are answered with a 304 when the request's If-None-Match matches.
+    Content-Length is the gzip compressed size when the request accepts gzip, like the api. The
+    headers of a request are merged over the default headers of `requests.Session` (which
+    accept gzip), as they are for the real session.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    workspace_id = "fakeworkspace"
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        latency=0.15,
+        time_scale=1.0,
+        existing_entries=0,
+        timezone="Asia/Singapore",
+        start_of_day="09:00",
+        locales=None,
+    ):
+        self.latency = latency
+        self.time_scale = time_scale
+        self.existing_entries = existing_entries
+        self.timezone = timezone
+        self.start_of_day = start_of_day
+        self.log = []
+        self.entries = {}
+        self._seeded = set()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._epoch = time.perf_counter()
+        self._base_path = urlparse(Clockify.api_base_endpoint).path
+
+        self.projects, self.tasks = [], {}
+        # pylint: disable=unbalanced-dict-unpacking
+        for task_full, project in Clockify.task_project_dict.values():
+            if project not in [existing["name"] for existing in self.projects]:
+                self.projects.append({"id": self._new_id("project"), "name": project})
+            project_id = next(p["id"] for p in self.projects if p["name"] == project)
+            self.tasks.setdefault(project_id, []).append(
+                {"id": self._new_id("task"), "name": task_full}
+            )
+        self.tags = [
+            {"id": self._new_id("tag"), "name": locale}
+            for locale in locales or Config.locale_list
+        ]
+
+    def _new_id(self, kind):
+        return f"fake{kind}{next(self._ids)}"
+
+    def request(self, method, url, params=None, json=None, headers=None, **_):
+        """Handle a request like `requests.Session.request`"""
+        # pylint: disable=redefined-outer-name
+        headers = {**requests.utils.default_headers(), **(headers or {})}
+        started = time.perf_counter()
+        time.sleep(self.latency * self.time_scale)
+        path = urlparse(url).path[len(self._base_path) :]
+        user_id = f"fakeuser-{headers.get('X-Api-Key')}"
+        with self._lock:
+            status_code, body = self._route(method, path, user_id, params or {}, json)
+            endpoint, response_headers = Clockify.endpoint_name(path), {}
+            if method == "GET" and status_code == 200 and endpoint != "time_entries":
+                response_headers["ETag"] = self._etag(body)
+                if headers.get("If-None-Match") == response_headers["ETag"]:
+                    status_code, body = 304, None
+            self.log.append(
+                (
+                    method,
+                    endpoint,
+                    (started - self._epoch) / self.time_scale,
+                    (time.perf_counter() - self._epoch) / self.time_scale,
+                )
+            )
+        response = build_json_response(status_code, body, url, response_headers)
+        if "gzip" in headers.get("Accept-Encoding", ""):
+            response.headers["Content-Length"] = str(
+                len(gzip.compress(response.content))
+            )
+        else:
+            response.headers["Content-Length"] = str(len(response.content))
+        return response
+
+    def _route(self, method, path, user_id, params, body):
+        """Serve a request, returns (status code, response body)"""
+        # pylint: disable=too-many-return-statements
+        workspace = f"/workspaces/{self.workspace_id}"
+        parts = path[len(workspace) :].strip("/").split("/")
+        if method == "GET" and path == "/user":
+            settings = {"timeZone": self.timezone, "myStartOfDay": self.start_of_day}
+            user = {"id": user_id, "activeWorkspace": self.workspace_id}
+            return 200, {**user, "settings": settings}
+        if not path.startswith(workspace):
+            return 404, {"message": "Not found"}
+        if method == "GET" and parts == ["projects"]:
+            return 200, self._named_page(self.projects, params)
+        if method == "GET" and parts[0] == "projects" and parts[-1] == "tasks":
+            return 200, self._named_page(self.tasks.get(parts[1], []), params)
+        if method == "GET" and parts == ["tags"]:
+            return 200, self._named_page(self.tags, params)
+        if method == "GET" and parts[0] == "tags" and len(parts) == 2:
+            tag = next((tag for tag in self.tags if tag["id"] == parts[1]), None)
+            return (200, tag) if tag else (404, {"message": "Not found"})
+        if method == "GET" and parts[0] == "time-entries" and len(parts) == 2:
+            entry = self.entries.get(parts[1])
+            return (200, entry) if entry else (404, {"message": "Not found"})
+        if method == "GET" and parts[-1] == "time-entries":
+            self._seed(user_id, params["start"], params["end"])
+            return 200, self._page(
+                [
+                    entry
+                    for entry in self.entries.values()
+                    if entry["userId"] == user_id
+                    and params["start"]
+                    <= entry["timeInterval"]["start"]
+                    <= params["end"]
+                ],
+                params,
+            )
+        if method == "POST" and parts == ["time-entries"]:
+            return 201, self._add_entry(user_id, body)
+        if method == "DELETE" and parts[0] == "time-entries":
+            return (204, None) if self.entries.pop(parts[1], None) else (404, None)
+        return 404, {"message": "Not found"}
+
+    @staticmethod
+    def _etag(body):
+        """Validator of a response body, changes whenever the body does"""
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf8"))
+        return f'"{digest.hexdigest()[:16]}"'
+
+    @staticmethod
+    def _named_page(items, params):
+        """Filter a list of named items by name and return the requested page of it"""
+        name = params.get("name")
+        if name is not None:
+            if params.get("strict-name-search") == "true":
+                items = [item for item in items if item["name"] == name]
+            else:
+                items = [item for item in items if name.lower() in item["name"].lower()]
+        return FakeClockifyAPI._page(items, params)
+
+    @staticmethod
+    def _page(items, params):
+        """Requested page of a list of items"""
+        page, page_size = int(params.get("page", 1)), int(params.get("page-size", 50))
+        return items[(page - 1) * page_size : page * page_size]
+
+    def _seed(self, user_id, range_start, range_end):
+        """Create the pre-existing entries the first time each day of a user is fetched"""
+        day = datetime.strptime(range_start, "%Y-%m-%dT%H:%M:%SZ")
+        while day.strftime("%Y-%m-%dT%H:%M:%SZ") <= range_end:
+            day_start = day.strftime("%Y-%m-%dT%H:%M:%SZ")
+            day += timedelta(days=1)
+            if (user_id, day_start) in self._seeded:
+                continue
+            self._seeded.add((user_id, day_start))
+            for _ in range(self.existing_entries):
+                self._add_entry(user_id, {"start": day_start, "end": day_start})
+
+    def _add_entry(self, user_id, body):
+        entry = {
+            "id": self._new_id("entry"),
+            "userId": user_id,
+            "workspaceId": self.workspace_id,
+            "projectId": body.get("projectId"),
+            "taskId": body.get("taskId"),
+            "tagIds": body.get("tagIds", []),
+            "timeInterval": {"start": body["start"], "end": body["end"]},
+        }
+        self.entries[entry["id"]] = entry
+        return entry
+
+
+class SimulatedClockify(Clockify):
+    """Clockify with its own id caches, like every team member running their own process"""
+
+    def __init__(self, *args, **kwargs):
+        self.workspace_user_cache = {}
+        self.project_id_cache = {}
+        self.task_id_cache = {}
+        self.locale_id_cache = {}
+        super().__init__(*args, **kwargs)
+
+
+# pylint: disable=too-many-arguments
+def simulate(
+    team_size,
+    start_date,
+    count,
+    task_and_hours,
+    cal,
+    workers=1,
+    locale="en_SG",
+    latency=0.15,
+    existing_entries=1,
+    time_scale=0.1,
+):
+    """Run the full submission pipeline for a team against a fake clockify api
+
+    Every team member submits the same date range at the same moment, each with their own
+    `Clockify` object submitting `workers` dates concurrently. Latencies are slept scaled by
+    `time_scale` and scaled back when reporting, to keep the simulation quick.
+
+    Returns:
+        report (dict): see `summarize`
+    """
+    api = FakeClockifyAPI(
+        latency=latency,
+        time_scale=time_scale,
+        existing_entries=existing_entries,
+        locales=[locale],
+    )
+    working_dates, holidays = get_working_dates(start=start_date, count=count, cal=cal)
+    submissions = [(date, task_and_hours) for date in working_dates] + [
+        (date, {"holiday": 8}) for date in holidays
+    ]
+
+    def submit_as(user):
+        clockify = SimulatedClockify(f"simulated{user}", locale=locale, session=api)
+        clockify.submit_all(submissions, workers=workers)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, team_size)) as executor:
+        for result in [executor.submit(submit_as, user) for user in range(team_size)]:
+            result.result()
+    elapsed = (time.perf_counter() - started) / time_scale
+    return summarize(api.log, elapsed, team_size, len(submissions))
+
+
+def concurrency_profile(request_log):
+    """Time weighted percentiles of the number of requests in flight
+
+    Returns:
+        profile (dict): eg) {"p50": 3, "p90": 8, "p99": 10, "p100": 10}
+    """
+    # Sweep over start/end events to find the time spent at every concurrency level
+    events = sorted(
+        [(start, 1) for _, _, start, _ in request_log]
+        + [(end, -1) for _, _, _, end in request_log]
+    )
+    in_flight, last_time, time_at_level = 0, 0.0, Counter()
+    for event_time, change in events:
+        time_at_level[in_flight] += event_time - last_time
+        in_flight, last_time = in_flight + change, event_time
+    total_time = sum(time_at_level.values())
+
+    profile, elapsed = {}, 0.0
+    for level, duration in sorted(time_at_level.items()):
+        elapsed += duration
+        for percentile in (50, 90, 99):
+            if (
+                f"p{percentile}" not in profile
+                and elapsed >= total_time * percentile / 100
+            ):
+                profile[f"p{percentile}"] = level
+    profile["p100"] = max(time_at_level, default=0)
+    return profile
+
+
+def summarize(request_log, wall_time, team_size, dates):
+    """Summarize a log of (method, endpoint, start, end) requests
+
+    Returns:
+        report (dict): request counts, time weighted percentiles of the number of requests in
+            flight, peak requests per second and the wall time in (unscaled) seconds
+    """
+    by_endpoint = Counter(
+        f"{method} {endpoint}" for method, endpoint, _, _ in request_log
+    )
+
+    profile = concurrency_profile(request_log)
+
+    starts = sorted(start for _, _, start, _ in request_log)
+    peak_rps, window_start = 0, 0
+    for index, start in enumerate(starts):
+        while starts[window_start] <= start - 1.0:
+            window_start += 1
+        peak_rps = max(peak_rps, index - window_start + 1)
+
+    return {
+        "users": team_size,
+        "dates_per_user": dates,
+        "requests": len(request_log),
+        "requests_per_user": len(request_log) / max(1, team_size),
+        "requests_by_endpoint": dict(sorted(by_endpoint.items())),
+        "peak_concurrency": profile["p100"],
+        "concurrency_profile": profile,
+        "peak_requests_per_second": peak_rps,
+        "estimated_wall_time": wall_time,
+    }
+
+
+def format_report(report):
+    """Human readable lines of a simulation report"""
+    lines = [
+        f"Simulated {report['users']} user(s) submitting {report['dates_per_user']} date(s) each",
+        f"Requests: {report['requests']} ({report['requests_per_user']:.1f} per user)",
+    ]
+    lines += [
+        f"    {endpoint:<20} {count}"
+        for endpoint, count in report["requests_by_endpoint"].items()
+    ]
+    lines += [
+        f"Peak concurrency: {report['peak_concurrency']} requests in flight",
+        "Requests in flight, time weighted percentiles: "
+        + ", ".join(
+            f"{percentile}={level}"
+            for percentile, level in report["concurrency_profile"].items()
+        ),
+    ]
+    lines += [
+        f"Peak requests per second: {report['peak_requests_per_second']}",
+        f"Estimated wall time: {report['estimated_wall_time']:.2f}s",
+    ]
+    return lines
@@ -0,0 +1,40 @@
+""" Small SQLite databases shared by every tp-timesheet process on a host """
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """Base class of the SQLite backed stores
+
+    Every thread gets its own connection and writes go through `transaction`, which takes the
+    database write lock up front so read-modify-write sequences are atomic across processes.
+    """
+
+    schema = ""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        """Connection of the calling thread, the schema is created on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.executescript(self.schema)
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in an immediate (write locked) transaction"""
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
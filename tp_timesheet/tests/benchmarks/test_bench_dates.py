@@ -0,0 +1,85 @@
+"""Micro-benchmarks of the date parsing and the working day calendar, see README to run them"""
+import time
+import warnings
+from datetime import date, datetime, timedelta
+import pytest
+from workalendar.registry import registry
+from tp_timesheet.config import Config
+from tp_timesheet.date_utils import assert_start_date, get_start_date, get_working_dates
+
+# Workalendar region of every supported locale, None when workalendar has no calendar for it
+LOCALE_REGIONS = {
+    locale: locale.split("_")[1]
+    if locale.split("_")[1] in registry.region_registry
+    else None
+    for locale in Config.locale_list
+}
+# 1 day to 10 years, the calendars of some regions only have holiday data from 2010 to 2024
+RANGES = {"1d": 1, "1w": 7, "1m": 30, "1y": 365, "10y": 3650}
+START = date(2015, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def fixture_ignore_calendar_warnings():
+    """Keep workalendar's warnings out of the timings"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+@pytest.mark.parametrize("count", RANGES.values(), ids=RANGES.keys())
+@pytest.mark.parametrize("locale", LOCALE_REGIONS)
+def test_get_working_dates(benchmark, locale, count):
+    """Working dates of a range with a new calendar, like every run of the cli"""
+    if LOCALE_REGIONS[locale] is None:
+        pytest.skip(f"workalendar has no calendar for {locale}")
+    calendar_class = registry.get(LOCALE_REGIONS[locale])
+    working_dates, holidays = benchmark.pedantic(
+        get_working_dates,
+        setup=lambda: ((), {"start": START, "count": count, "cal": calendar_class()}),
+        rounds=50,
+        warmup_rounds=2,
+    )
+    assert len(working_dates) + len(holidays) <= count
+
+
+def test_working_dates_scale_linearly():
+    """Gate on machine independent timings: a day of a 10 year range costs at most twice as
+    much as a day of a 1 year range, catching slowdowns such as holidays recomputed every day
+    """
+
+    def best_of_5(calendar_class, count):
+        timings = []
+        for _ in range(5):
+            calendar = calendar_class()
+            started = time.perf_counter()
+            get_working_dates(start=START, count=count, cal=calendar)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    for region in sorted(set(filter(None, LOCALE_REGIONS.values()))):
+        calendar_class = registry.get(region)
+        ratio = best_of_5(calendar_class, 3650) / best_of_5(calendar_class, 365)
+        assert ratio < 2 * 10, f"{region}: 10 years take {ratio:.1f}x 1 year"
+
+
+START_DATES = {
+    "today": "today",
+    "4 digit year": "08/08/2022",
+    "2 digit year": "8/8/22",  # parsed twice, the nearest candidate to today wins
+    "iso": "2022-08-08",
+}
+
+
+@pytest.mark.parametrize("start", START_DATES.values(), ids=START_DATES.keys())
+def test_get_start_date(benchmark, start):
+    """Parse the --start argument"""
+    assert isinstance(benchmark(get_start_date, start), date)
+
+
+def test_assert_start_date(benchmark, monkeypatch):
+    """Sanity check of the start date, runs on every invocation"""
+    monkeypatch.setattr(Config, "SANITY_CHECK_START_DATE", "True", raising=False)
+    monkeypatch.setattr(Config, "SANITY_CHECK_RANGE", "7", raising=False)
+    start_date = datetime.today().date() - timedelta(days=3)
+    assert benchmark(assert_start_date, start_date)
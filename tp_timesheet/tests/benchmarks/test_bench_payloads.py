@@ -0,0 +1,49 @@
+"""Bytes and requests of a month of submissions against the fake api, see README to run them"""
+from datetime import date
+import pytest
+from workalendar.asia import Singapore
+from tp_timesheet.date_utils import get_working_dates
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+class UnbatchedClockify(SimulatedClockify):
+    """The client before the range prefetch: one time entries request per date"""
+
+    def prefetch_time_entries(self, dates):
+        """Leave every date to fetch its own time entries"""
+
+
+CLIENTS = {"before": UnbatchedClockify, "after": SimulatedClockify}
+# Requests and bytes received of the month by the current client, they are deterministic so
+# any increase fails the test, unlike the timings which depend on the machine
+BUDGET = {"requests": 72, "bytes_received": 8229}
+
+
+@pytest.mark.parametrize("client", CLIENTS.values(), ids=CLIENTS.keys())
+def test_submit_month(benchmark, client):
+    """Submit a month with one existing entry per day, bytes received are in extra_info"""
+    working_dates, holidays = get_working_dates(
+        start=date(2022, 8, 1), count=30, cal=Singapore()
+    )
+    submissions = [(day, {"live": 4, "OOO": 4}) for day in working_dates] + [
+        (day, {"holiday": 8}) for day in holidays
+    ]
+    runs = []
+
+    def setup():
+        api = FakeClockifyAPI(latency=0, existing_entries=1, locales=["en_SG"])
+        clockify = client("benchmark", locale="en_SG", session=api)
+        runs.append((api, clockify))
+        return (submissions,), {}
+
+    def submit(submissions):
+        runs[-1][1].submit_all(submissions)
+
+    benchmark.pedantic(submit, setup=setup, rounds=5)
+    api, clockify = runs[-1]
+    benchmark.extra_info["requests"] = len(api.log)
+    benchmark.extra_info["bytes_received"] = dict(clockify.bytes_received)
+    benchmark.extra_info["total_bytes_received"] = sum(clockify.bytes_received.values())
+    if client is SimulatedClockify:
+        assert len(api.log) <= BUDGET["requests"]
+        assert sum(clockify.bytes_received.values()) <= BUDGET["bytes_received"]
@@ -0,0 +1,75 @@
+"""Unit tests for the persistent circuit breaker"""
+import time
+from datetime import date
+import pytest
+import requests
+from tp_timesheet.breaker import CircuitBreaker, CircuitOpenError
+from tp_timesheet.jobqueue import JobQueue, work
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+class DownAPI:  # pylint: disable=too-few-public-methods
+    """Session whose connections fail, as when the api is down"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, *_, **__):
+        """Fail like `requests.Session.request` does without a connection"""
+        self.calls += 1
+        raise requests.ConnectionError("Connection refused")
+
+
+def test_breaker_opens_and_recovers(tmp_path):
+    """Test the breaker fails fast once open, lets one probe through and closes on success"""
+    path = tmp_path.joinpath("breaker.sqlite")
+    breaker = CircuitBreaker(failures=2, reset=0.2, path=path)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+
+    # The state is shared with other processes using the same file
+    other_process = CircuitBreaker(failures=2, reset=0.2, path=path)
+    assert other_process.state == "open"
+    with pytest.raises(CircuitOpenError):
+        other_process.before_request()
+
+    time.sleep(0.2)
+    breaker.before_request()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        other_process.before_request()
+    breaker.record_success()
+    assert other_process.state == "closed"
+    other_process.before_request()
+
+
+def test_requests_fail_fast(tmp_path):
+    """Test requests are no longer sent once the breaker has opened"""
+    api = DownAPI()
+    breaker = CircuitBreaker(failures=2, path=tmp_path.joinpath("breaker.sqlite"))
+    clockify = SimulatedClockify("down", locale="en_SG", session=api)
+    clockify.circuit_breaker = breaker
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            clockify.get_time_entries(date(2022, 8, 8))
+    with pytest.raises(CircuitOpenError):
+        clockify.get_time_entries(date(2022, 8, 8))
+    assert api.calls == 2
+
+
+def test_worker_leaves_jobs_queued(tmp_path):
+    """Test workers stop without using up attempts while the breaker is open"""
+    breaker = CircuitBreaker(failures=1, path=tmp_path.joinpath("breaker.sqlite"))
+    breaker.record_failure()
+    job_queue = JobQueue(path=tmp_path.joinpath("queue.sqlite"))
+    job_queue.enqueue("user", "key", "en_SG", [(date(2022, 8, 8), {"live": 8})])
+
+    def clockify_factory(api_key, locale):
+        clockify = SimulatedClockify(api_key, locale=locale, session=FakeClockifyAPI())
+        clockify.circuit_breaker = breaker
+        return clockify
+
+    assert work(job_queue, clockify_factory, workers=2) == 0
+    assert job_queue.counts() == {"queued": 1}
+    assert job_queue.claim().tasks == {"live": 8}
@@ -1,14 +1,15 @@
-"""Unit tests for the retrieving of ids"""
-import random
+"""Unit tests for the retrieving of ids, replayed from the cassettes recorded against the api
+
+Set TP_TIMESHEET_RECORD=1 and CLOCKIFY_CRED to an api key to run them against the live api
+instead, which records the cassettes again.
+"""
 import datetime
 import json
-import requests
-from tp_timesheet.clockify_timesheet import Clockify
-from tp_timesheet.config import Config
-
-# Import config fixture from adjacent test
-# pylint: disable=(unused-import)
-from .test_config import fixture_create_tmp_clockify_api_config
+import os
+from pathlib import Path
+import pytest
+from tp_timesheet.simulate import SimulatedClockify
+from tp_timesheet.transport import RecordingTransport, ReplayTransport
 
 WORKSPACE_ID = "5fa423e902f38d2ce68f3169"
 PROJECT_ID = "62fd2e27df8f7e3135ab424f"
@@ -18,21 +19,37 @@ TASK_IDS = [
     "63ab0fb70bf68b59badc8b8d",  # Out Of Office
     "63ab0fb40bf68b59badc8b61",  # Holiday
 ]
+CASSETTES = Path(__file__).parent.joinpath("cassettes")
+LOCALE = "en_SG"
+
+
+@pytest.fixture(name="clockify")
+def fixture_recorded_clockify(request):
+    """Clockify replaying the cassette of the test, or recording it with TP_TIMESHEET_RECORD=1
+
+    Every test has its own cassette and id caches, so it can be replayed on its own.
+    """
+    cassette = CASSETTES.joinpath(f"{request.node.name}.json")
+    if os.getenv("TP_TIMESHEET_RECORD") == "1":
+        api_key = os.environ["CLOCKIFY_CRED"]
+        session = RecordingTransport(cassette)
+    else:
+        api_key = "replayed-api-key"
+        session = ReplayTransport(cassette)
+    return SimulatedClockify(api_key=api_key, locale=LOCALE, session=session)
 
 
-def test_ids(clockify_config):
+def test_ids(clockify):
     """
     Test for checking validity of workspace, project and task ids obtained from request
     """
-    config = Config(config_filename=clockify_config)
-    clockify_val = Clockify(api_key=config.CLOCKIFY_API_KEY, locale=config.LOCALE)
     assert (
-        clockify_val.workspace_id == WORKSPACE_ID
-    ), f"Workspace ID Error, expected: {WORKSPACE_ID}, result:{clockify_val.workspace_id}"
+        clockify.workspace_id == WORKSPACE_ID
+    ), f"Workspace ID Error, expected: {WORKSPACE_ID}, result:{clockify.workspace_id}"
 
     for task_idx, task_short in enumerate(["live", "training", "OOO", "holiday"]):
-        project_id = clockify_val.get_project_id(task_short)
-        task_id = clockify_val.get_task_id(project_id, task_short)
+        project_id = clockify.get_project_id(task_short)
+        task_id = clockify.get_task_id(project_id, task_short)
         assert (
             project_id == PROJECT_ID
         ), f"Project ID Error, expected: {PROJECT_ID}, result:{project_id}"
@@ -41,7 +58,7 @@ def test_ids(clockify_config):
         ), f"Project ID Error, expected: {TASK_IDS[task_idx]}, result:{task_id}"
 
 
-def test_remove_existing_entries(clockify_config):
+def test_remove_existing_entries(clockify):
     """Test removal of clockify time entries.
 
     Test coverage:
@@ -58,14 +75,8 @@ def test_remove_existing_entries(clockify_config):
             f"TESTING DATE: {test_date}"
         )
 
-    # Instantiate a Clockify object
-    config = Config(config_filename=clockify_config)
-    clockify = Clockify(api_key=config.CLOCKIFY_API_KEY, locale=config.LOCALE)
-
-    # Use following date as test date. Random future date in January
-    test_date = datetime.date(
-        2025 + random.randrange(0, 10, 1), 1, 1 + random.randrange(0, 30, 1)
-    )
+    # Future date, a fixed one so the requests match the cassette
+    test_date = datetime.date(2030, 1, 14)
 
     # Remove all entries incase any are left over from previous tests
     clockify.delete_time_entry(test_date)
@@ -92,17 +103,11 @@ def test_remove_existing_entries(clockify_config):
     assert_number_of_entries(test_date, 0)
 
 
-def test_time_entry_tags(clockify_config):
+def test_time_entry_tags(clockify):
     """Test that time entries include a tag"""
 
-    # Instantiate a Clockify object
-    config = Config(config_filename=clockify_config)
-    clockify = Clockify(api_key=config.CLOCKIFY_API_KEY, locale=config.LOCALE)
-
-    # Use following date as test date. Random future date in January
-    test_date = datetime.date(
-        2025 + random.randrange(0, 10, 1), 1, 1 + random.randrange(0, 30, 1)
-    )
+    # Future date, a fixed one so the requests match the cassette
+    test_date = datetime.date(2030, 1, 15)
 
     # Remove all entries incase any are left over from previous tests
     clockify.delete_time_entry(test_date)
@@ -111,27 +116,24 @@ def test_time_entry_tags(clockify_config):
     clockify.submit_clockify(test_date, {"live": 8})
 
     # Check entry contains a tag with the intended locale
+    # pylint: disable=protected-access
     task_id = clockify.get_time_entry_id(test_date)
     assert len(task_id) == 1
     task_id = task_id[0]
-    response = requests.get(
-        f"{clockify.api_base_endpoint}/workspaces/{clockify.workspace_id}/time-entries/{task_id}",
-        headers={"X-Api-Key": clockify.api_key},
-        timeout=2,
+    response = clockify._request(
+        "GET", f"/workspaces/{clockify.workspace_id}/time-entries/{task_id}"
     )
     response.raise_for_status()
     response_dict = json.loads(response.text)
     # Check tag ids match
     assert response_dict["tagIds"] == [clockify.locale_id]
     # Check tag name is as expected
-    response = requests.get(
-        f"{clockify.api_base_endpoint}/workspaces/{clockify.workspace_id}/tags/{clockify.locale_id}",
-        headers={"X-Api-Key": clockify.api_key},
-        timeout=2,
+    response = clockify._request(
+        "GET", f"/workspaces/{clockify.workspace_id}/tags/{clockify.locale_id}"
     )
     response.raise_for_status()
     response_dict = json.loads(response.text)
-    assert response_dict["name"] == config.LOCALE
+    assert response_dict["name"] == LOCALE
 
     # Remove all entries
     clockify.delete_time_entry(test_date)
@@ -0,0 +1,110 @@
+"""Unit tests for the adaptive concurrency limit, runs without the clockify api"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tp_timesheet.concurrency import AdaptiveConcurrencyLimiter
+from tp_timesheet.simulate import (
+    FakeClockifyAPI,
+    SimulatedClockify,
+    build_json_response,
+)
+
+
+def test_additive_increase_multiplicative_decrease():
+    """Test the limit grows while in use and halves once per congestion event"""
+    limiter = AdaptiveConcurrencyLimiter(initial=2, maximum=4)
+    for _ in range(20):
+        sent = [limiter.acquire() for _ in range(int(limiter.limit))]
+        for request in sent:
+            limiter.release(request)
+    assert limiter.limit == 4
+    assert limiter.peak_in_flight == 4
+
+    # Four requests in flight are throttled, only the first 429 lowers the limit
+    sent = [limiter.acquire() for _ in range(4)]
+    for request in sent:
+        limiter.release(request, overloaded=True)
+    assert (limiter.limit, limiter.decreases) == (2, 1)
+    # A request sent after the decrease starts a new congestion event
+    limiter.release(limiter.acquire(), overloaded=True)
+    assert (limiter.limit, limiter.decreases) == (1, 2)
+    limiter.release(limiter.acquire(), overloaded=True)
+    assert limiter.limit == 1
+    assert limiter.stats() == {
+        "in_flight": 0,
+        "peak_in_flight": 4,
+        "limit": 1,
+        "decreases": 3,
+    }
+
+
+def test_rising_latency_lowers_the_limit():
+    """Test responses getting much slower than the fastest one lower the limit"""
+    limiter = AdaptiveConcurrencyLimiter(initial=4)
+    for latency in [0.01] + [0.2] * 5:
+        limiter.acquire()
+        limiter.release(time.monotonic() - latency)
+    assert limiter.limit < 4
+    assert limiter.in_flight == 0
+
+
+def test_slower_endpoints_do_not_lower_the_limit():
+    """Test writes slower than reads are not mistaken for congestion of a healthy api"""
+    limiter = AdaptiveConcurrencyLimiter(initial=4)
+    for _ in range(50):
+        for endpoint, latency in [
+            ("GET time_entries", 0.06),
+            ("POST time_entries", 0.15),
+        ]:
+            sent = [limiter.acquire() for _ in range(int(limiter.limit))]
+            for _ in sent:
+                limiter.release(time.monotonic() - latency, endpoint=endpoint)
+    assert limiter.decreases == 0
+    assert limiter.limit > 4
+
+
+class ThrottlingAPI(FakeClockifyAPI):  # pylint: disable=too-few-public-methods
+    """Fake api answering with a 429 whenever more than `capacity` requests are in flight"""
+
+    def __init__(self, capacity, **kwargs):
+        super().__init__(**kwargs)
+        self.capacity = capacity
+        self.in_flight = 0
+        self.throttled = 0
+        self.counter_lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
+        """Throttle above capacity, like the api's rate limit"""
+        with self.counter_lock:
+            self.in_flight += 1
+            over_capacity = self.in_flight > self.capacity
+            self.throttled += over_capacity
+        try:
+            if over_capacity:
+                time.sleep(self.latency)
+                return build_json_response(429, {"message": "Too many requests"}, url)
+            return super().request(method, url, **kwargs)
+        finally:
+            with self.counter_lock:
+                self.in_flight -= 1
+
+
+def test_client_backs_off_when_throttled():
+    """Test concurrent requests of a client settle under the api's capacity"""
+    api = ThrottlingAPI(capacity=2, latency=0.01, locales=["en_SG"])
+    limiter = AdaptiveConcurrencyLimiter(initial=8, maximum=8)
+    clockify = SimulatedClockify(
+        "throttled", locale="en_SG", session=api, concurrency_limiter=limiter
+    )
+    path = f"/workspaces/{clockify.workspace_id}/tags"
+    # pylint: disable=protected-access
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(
+            executor.map(
+                lambda _: clockify._request("GET", path).status_code, range(200)
+            )
+        )
+    assert limiter.decreases >= 1
+    assert limiter.stats()["limit"] <= 4
+    # Once the limit settled, fewer requests are throttled
+    assert statuses[-50:].count(429) <= statuses[:50].count(429)
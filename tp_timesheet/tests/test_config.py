@@ -127,3 +127,12 @@ def test_config_upgrade_process(tmp_v3_config):
     )
     for key, item in new_parameters.items():
         assert config_dict.get("configuration", key) == item
+
+
+def test_unknown_notification_backend(mock_config, caplog):
+    """Test an unknown notification backend falls back to logging with a warning"""
+    with open(mock_config, "a", encoding="utf8") as conf_file:
+        conf_file.write("\nnotification_backend = growl\n")
+    Config(config_filename=mock_config)
+    assert Config.NOTIFICATION_BACKEND == "log"
+    assert "Unknown notification_backend 'growl'" in caplog.text
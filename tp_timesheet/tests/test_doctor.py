@@ -0,0 +1,37 @@
+"""Unit tests for the doctor diagnostics, the lookups are timed against the fake clockify api"""
+import json
+from types import SimpleNamespace
+from tp_timesheet.doctor import CACHE_NAMES, Phases, diagnose, format_report
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+def test_diagnose_lookups():
+    """Test every lookup is timed, even when the ids are cached, and the report is complete"""
+    api = FakeClockifyAPI(latency=0.01, locales=["en_SG"])
+    clockify = SimulatedClockify("doctor", locale="en_SG", session=api)
+    clockify.get_project_id("live")
+    config = SimpleNamespace(
+        CLOCKIFY_API_KEY="doctor",
+        LOCALE="en_SG",
+        CONFIG_PATH="tp.conf",
+        LOG_PATH="tp.logs",
+        CONFIG_DIR=".",
+    )
+    report = diagnose(config, clockify, config_seconds=0.002, network=False)
+
+    phases = {row["phase"]: row for row in report["phases"]}
+    assert phases["config load"]["ms"] == 2.0
+    assert phases["lookup project of live"]["ms"] >= 10
+    assert phases["lookup task holiday"]["status"] == "ok"
+    assert "working dates (1 year)" in phases
+    assert list(report["caches"]) == list(CACHE_NAMES)
+    assert report["paths"]["config"] == "tp.conf"
+    json.dumps(report)
+    assert format_report(report)[0].split() == ["phase", "ms", "status"]
+
+
+def test_failing_phase():
+    """Test a failing phase is reported with its error"""
+    phases = Phases()
+    assert phases.time("broken", lambda: 1 / 0) is None
+    assert phases.results[0]["status"] == "error: division by zero"
@@ -0,0 +1,69 @@
+"""Unit tests for http timeouts and hedged requests, runs without the clockify api"""
+import configparser
+import threading
+import time
+from tp_timesheet.config import Config
+from tp_timesheet.simulate import build_json_response
+
+# Import offline clockify fixture from adjacent test
+# pylint: disable=(unused-import)
+from .test_transaction import fixture_offline_clockify
+
+
+class SlowFirstSession:  # pylint: disable=too-few-public-methods
+    """Session whose first request stalls, any later request answers immediately"""
+
+    def __init__(self):
+        self.calls = 0
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def request(
+        self, method, url, timeout=None, **_
+    ):  # pylint: disable=unused-argument
+        """Record the request and answer with the call number as body"""
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            self.timeouts.append(timeout)
+        if call == 1:
+            time.sleep(1)
+        return build_json_response(200, call, url)
+
+
+def test_timeouts_from_config():
+    """Test default and per endpoint timeouts are parsed from the config"""
+    config = configparser.ConfigParser()
+    config.read_dict(
+        {
+            "configuration": {
+                "http_timeout": "3.05, 5",
+                "http_timeout_time_entries": "2, 10",
+                "http_timeout_tags": "4",
+                "http_hedge": "True",
+            }
+        }
+    )
+    assert Config.parse_http_timeouts(config) == {
+        "default": (3.05, 5.0),
+        "time_entries": (2.0, 10.0),
+        "tags": (4.0, 4.0),
+    }
+
+
+def test_hedged_get(clockify):
+    """Test that a slow idempotent GET is hedged and the faster response is used"""
+    # pylint: disable=protected-access
+    session = SlowFirstSession()
+    clockify.session = session
+    clockify.timeouts = {"default": (3.05, 5.0), "tags": (0.1, 0.2)}
+    clockify.hedge = True
+
+    started = time.perf_counter()
+    assert clockify._request("GET", "/workspaces/ws/tags").json() == 2
+    assert time.perf_counter() - started < 0.5
+    assert session.timeouts == [(0.1, 0.2), (0.1, 0.2)]
+
+    # Writes are never hedged
+    clockify._request("POST", "/workspaces/ws/time-entries")
+    assert session.calls == 3
@@ -0,0 +1,74 @@
+"""Unit tests for the run history"""
+import sqlite3
+import time
+from datetime import date
+from tp_timesheet.concurrency import AdaptiveConcurrencyLimiter
+from tp_timesheet.history import RunHistory, RunLog, format_history
+from tp_timesheet.http_cache import HTTPCache
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+def test_record_and_query(tmp_path):
+    """Test runs are stored with their request counts and can be filtered and aggregated"""
+    history = RunHistory(path=tmp_path.joinpath("history.sqlite"))
+
+    api = FakeClockifyAPI(latency=0, locales=["en_SG"])
+    clockify = SimulatedClockify(
+        "history",
+        locale="en_SG",
+        session=api,
+        http_cache=HTTPCache(path=tmp_path.joinpath("http_cache.sqlite")),
+        concurrency_limiter=AdaptiveConcurrencyLimiter(initial=4),
+    )
+    run_log = RunLog("submit", user="user")
+    for sub_date in [date(2022, 8, 8), date(2022, 8, 9)]:
+        clockify.submit_clockify(sub_date, {"live": 8})
+        run_log.dates.append(sub_date)
+    run_log.clockify_objects.append(clockify)
+    history.record(run_log)
+
+    failed = RunLog("submit", user="user")
+    failed.started -= 40
+    failed.error = ConnectionError("api down")
+    failed_clockify = SimulatedClockify("history", locale="en_SG", session=api)
+    failed_clockify.status_counts.update({"429": 2, "error": 1})
+    failed.clockify_objects.append(failed_clockify)
+    history.record(failed)
+
+    latest, first = history.runs()
+    assert (latest["status"], first["status"]) == ("ok", "failed")
+    assert latest["date_count"] == 2
+    # user, tags, projects and tasks (all through the http cache), then a get and a post per day
+    assert latest["requests"] == 4 + 2 * 2
+    assert latest["cache_misses"] == 4
+    assert first["error"] == "ConnectionError('api down')"
+    assert (latest["peak_concurrency"], latest["concurrency_limit"]) == (1, 4)
+    assert first["peak_concurrency"] is None
+
+    assert [run["id"] for run in history.runs(throttled=True)] == [first["id"]]
+    assert [run["id"] for run in history.runs(slower_than=30)] == [first["id"]]
+    assert history.runs(since=time.time() + 60) == []
+
+    (today,) = history.daily()
+    assert (today["runs"], today["failed"], today["dates"], today["throttled"]) == (
+        2,
+        1,
+        2,
+        2,
+    )
+    assert len(format_history(history.runs(), history.daily())) == 1 + 2 + 2 + 1
+
+
+def test_older_history_gets_added_columns(tmp_path):
+    """Test a history file created before the concurrency columns existed still records runs"""
+    path = tmp_path.joinpath("history.sqlite")
+    schema = RunHistory.schema.replace(
+        ",\n            peak_concurrency INTEGER,\n            concurrency_limit REAL",
+        "",
+    )
+    assert "peak_concurrency" not in schema
+    with sqlite3.connect(path) as connection:
+        connection.executescript(schema)
+    history = RunHistory(path=path)
+    history.record(RunLog("dry-run"))
+    assert history.runs()[0]["peak_concurrency"] is None
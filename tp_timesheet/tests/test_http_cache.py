@@ -0,0 +1,37 @@
+"""Unit tests for the http cache of the metadata lookups, runs against the fake clockify api"""
+from tp_timesheet.http_cache import HTTPCache
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+def resolve_metadata(api, cache):
+    """Resolve the metadata and a project id like a fresh process would"""
+    clockify = SimulatedClockify(
+        "cached", locale="en_SG", session=api, http_cache=cache
+    )
+    return clockify.metadata, clockify.get_project_id("live")
+
+
+def test_fresh_responses_are_reused(tmp_path):
+    """Test responses within the freshness window are served without asking the api"""
+    api = FakeClockifyAPI(latency=0, locales=["en_SG"])
+    cache = HTTPCache(ttl=300, path=tmp_path.joinpath("http_cache.sqlite"))
+    first = resolve_metadata(api, cache)
+    assert [endpoint for _, endpoint, _, _ in api.log] == ["user", "tags", "projects"]
+    assert resolve_metadata(api, cache) == first
+    assert len(api.log) == 3
+    assert cache.stats == {"miss": 3, "fresh": 3}
+
+
+def test_stale_responses_are_revalidated(tmp_path):
+    """Test stale responses are revalidated with conditional requests and reused on a 304"""
+    api = FakeClockifyAPI(latency=0, locales=["en_SG"])
+    cache = HTTPCache(ttl=0, path=tmp_path.joinpath("http_cache.sqlite"))
+    first = resolve_metadata(api, cache)
+    assert resolve_metadata(api, cache) == first
+    assert len(api.log) == 6
+    assert cache.stats == {"miss": 3, "revalidated": 3}
+
+    api.tags[0]["id"] = "changedtag"
+    metadata, _ = resolve_metadata(api, cache)
+    assert metadata["locale_id"] == "changedtag"
+    assert cache.stats["miss"] == 4
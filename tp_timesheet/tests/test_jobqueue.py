@@ -0,0 +1,108 @@
+"""Unit tests for the shared job queue and worker mode"""
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import pytest
+from tp_timesheet.config import Config
+from tp_timesheet.jobqueue import JobQueue, work
+from tp_timesheet.ledger import SubmissionLedger
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+SUBMISSIONS = [
+    (date(2022, 8, 8), {"live": 8}),
+    (date(2022, 8, 9), {"holiday": 8}),
+    (date(2022, 8, 10), {"live": 4, "OOO": 4}),
+]
+
+
+@pytest.fixture(name="queue_path")
+def fixture_tmp_queue_path():
+    """Path for a tmp job queue, cleaned up after the test has run"""
+    queue_path = Config.CONFIG_DIR.joinpath(f"tmp_pytest_{uuid.uuid4().hex}.sqlite")
+    yield queue_path
+    if os.path.exists(queue_path):
+        os.remove(queue_path)
+
+
+def test_expired_lease_is_requeued(queue_path):
+    """Test a job of a dead worker is re-queued and can only be completed once"""
+    JobQueue(path=queue_path).enqueue("user", "key", "en_SG", SUBMISSIONS)
+    dead_worker = JobQueue(path=queue_path, lease=-1)
+    other_worker = JobQueue(path=queue_path)
+
+    abandoned = dead_worker.claim()
+    assert abandoned.date == date(2022, 8, 8)
+
+    # The lease has expired, so the job goes back to the queue
+    retried = other_worker.claim()
+    assert retried.id == abandoned.id
+    assert retried.tasks == {"live": 8}
+
+    # Only the current lease holder can complete it
+    assert not dead_worker.complete(abandoned)
+    assert other_worker.complete(retried)
+    assert not other_worker.complete(retried)
+    assert other_worker.counts() == {"done": 1, "queued": 2}
+
+
+def test_workers_drain_queue(queue_path, tmp_path):
+    """Test workers submit every queued job and record it in the ledger"""
+    job_queue = JobQueue(path=queue_path)
+    job_queue.enqueue("user", "key", "en_SG", SUBMISSIONS)
+    job_queue.enqueue("user", "key", "en_SG", [(date(2022, 8, 11), {"nap": 8})])
+    api = FakeClockifyAPI(latency=0)
+    ledger = SubmissionLedger(path=tmp_path.joinpath("ledger.sqlite"))
+
+    def clockify_factory(api_key, locale):
+        return SimulatedClockify(api_key, locale, session=api)
+
+    completed = work(job_queue, clockify_factory, workers=2, poll=0.01, ledger=ledger)
+    assert completed == len(SUBMISSIONS)
+    # The job with an unknown task fails its plan, before its date is touched
+    assert job_queue.counts() == {"done": len(SUBMISSIONS), "failed": 1}
+    assert len(api.entries) == 4
+    assert not any(
+        "2022-08-11" in entry["timeInterval"]["start"] for entry in api.entries.values()
+    )
+    for sub_date, task_and_hours in SUBMISSIONS:
+        plan = ledger.plan_hash(task_and_hours, "en_SG")
+        assert len(ledger.submitted("user", sub_date, plan)) == len(task_and_hours)
+
+
+def test_leases_of_slow_jobs_are_renewed(queue_path):
+    """Test a job slower than its lease is not handed to a second worker"""
+    JobQueue(path=queue_path).enqueue("user", "key", "en_SG", SUBMISSIONS)
+    submitted = Counter()
+    submitted_lock = threading.Lock()
+
+    api = FakeClockifyAPI(latency=0)
+
+    class SlowClockify(SimulatedClockify):
+        """Takes several leases to submit a date"""
+
+        def submit_clockify(self, date, task_and_hours, dry_run=False, entries=None):
+            """Count the submission of a date"""
+            time.sleep(0.5)
+            with submitted_lock:
+                submitted[date] += 1
+            return []
+
+    # Two worker processes, each with its own connection to the queue
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        completed = list(
+            executor.map(
+                lambda _: work(
+                    JobQueue(path=queue_path, lease=0.2),
+                    lambda api_key, locale: SlowClockify(api_key, locale, session=api),
+                    workers=2,
+                    poll=0.01,
+                ),
+                range(2),
+            )
+        )
+    assert sum(completed) == len(SUBMISSIONS)
+    assert submitted == Counter(sub_date for sub_date, _ in SUBMISSIONS)
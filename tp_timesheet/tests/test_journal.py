@@ -0,0 +1,57 @@
+"""Unit tests for the resumable run journal"""
+import os
+from datetime import date
+import pytest
+from tp_timesheet.journal import Journal
+
+SUBMISSIONS = [
+    (date(2022, 8, 8), {"live": 8}),
+    (date(2022, 8, 10), {"live": 4, "OOO": 4}),
+    (date(2022, 8, 9), {"holiday": 8}),
+]
+
+
+@pytest.fixture(name="journal")
+def fixture_create_tmp_journal(tmp_path):
+    """Creates a journal in a tmp directory prior to running a test that uses this fixture"""
+    yield Journal(directory=tmp_path)
+
+
+def test_resume_pending_dates(journal):
+    """Test that only dates which were not checkpointed are resumed"""
+    journal.begin(SUBMISSIONS)
+    journal.mark_done(date(2022, 8, 8))
+
+    # A new process picks up the journal of the interrupted run
+    resumed = Journal(directory=journal.directory)
+    assert resumed.load()
+    assert resumed.path == journal.path
+    assert resumed.pending() == SUBMISSIONS[1:]
+
+    for sub_date, _ in resumed.pending():
+        resumed.mark_done(sub_date)
+    assert not Journal(directory=journal.directory).load()
+
+    resumed.finish()
+    assert not os.path.exists(journal.path)
+    assert not Journal(directory=journal.directory).load()
+
+
+def test_new_run_keeps_interrupted_journal(journal):
+    """Test a scheduled run after an interrupted one leaves it to --resume"""
+    journal.begin(SUBMISSIONS)
+    journal.mark_done(date(2022, 8, 8))
+
+    # The next morning's `--start today` run, which also submits the 10th
+    scheduled = Journal(directory=journal.directory)
+    scheduled.begin([(date(2022, 8, 10), {"training": 8})])
+    scheduled.mark_done(date(2022, 8, 10))
+    scheduled.finish()
+
+    resumed = Journal(directory=journal.directory)
+    assert resumed.load()
+    assert resumed.pending() == [SUBMISSIONS[2]]
+    resumed.mark_done(date(2022, 8, 9))
+    resumed.finish()
+    assert not Journal(directory=journal.directory).load()
+    assert not list(journal.directory.iterdir())
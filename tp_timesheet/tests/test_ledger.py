@@ -0,0 +1,54 @@
+"""Unit tests for the ledger of submitted dates"""
+import os
+import subprocess
+import sys
+import uuid
+from datetime import date
+import pytest
+from tp_timesheet.__main__ import skip_submitted
+from tp_timesheet.config import Config
+from tp_timesheet.ledger import SubmissionLedger
+
+
+class VerifyStub:  # pylint: disable=too-few-public-methods
+    """Stand-in for `Clockify` returning the entries currently on the server"""
+
+    def __init__(self, server_entries):
+        self.server_entries = server_entries
+
+    def get_time_entry_id(self, entry_date):
+        """Entry ids on the server for a date"""
+        return self.server_entries.get(entry_date, [])
+
+
+@pytest.fixture(name="ledger")
+def fixture_tmp_ledger():
+    """Ledger backed by a tmp file, cleaned up after the test has run"""
+    ledger_path = Config.CONFIG_DIR.joinpath(f"tmp_pytest_{uuid.uuid4().hex}.sqlite")
+    yield SubmissionLedger(path=ledger_path)
+    os.remove(ledger_path)
+
+
+def test_skip_submitted_dates(ledger):
+    """Test only dates submitted with the same plan are skipped"""
+    monday, tuesday = date(2022, 8, 8), date(2022, 8, 10)
+    ledger.record("user", monday, ledger.plan_hash({"live": 8}, "en_SG"), ["a"])
+    ledger.record("user", tuesday, ledger.plan_hash({"live": 8}, "en_SG"), ["b"])
+    submissions = [(monday, {"live": 8}), (tuesday, {"live": 4, "OOO": 4})]
+
+    assert skip_submitted(submissions, ledger, "user", "en_SG") == submissions[1:]
+    assert skip_submitted(submissions, ledger, "other_user", "en_SG") == submissions
+    assert skip_submitted(submissions, ledger, "user", "ko_KR") == submissions
+
+    # Entries were changed on the server since they were submitted
+    verify = VerifyStub({monday: ["a", "c"]})
+    assert skip_submitted(submissions, ledger, "user", "en_SG", verify) == submissions
+
+
+def test_fast_path_does_not_import_http_stack():
+    """Test the cli module can be loaded without importing the http libraries"""
+    code = "import sys, tp_timesheet.__main__; print('requests' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,77 @@
+"""Unit tests for the non-blocking notification dispatcher"""
+import sys
+import time
+from datetime import date
+import pytest
+from tp_timesheet.__main__ import submitted_text
+from tp_timesheet.config import Config
+from tp_timesheet.notify import (
+    BACKENDS,
+    LogBackend,
+    Notifier,
+    OsascriptBackend,
+    applescript_string,
+    select_backend,
+)
+
+
+class HangingBackend:  # pylint: disable=too-few-public-methods
+    """Backend whose notification never returns, like a dialog nobody dismisses"""
+
+    name = "hanging"
+
+    @staticmethod
+    def command(message, urgent, timeout):  # pylint: disable=unused-argument
+        """Command sleeping much longer than the notification timeout"""
+        return [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+def test_notify_does_not_block():
+    """Test a hanging notification neither delays the caller nor outlives its timeout"""
+    notifier = Notifier("log", timeout=0.3)
+    notifier.backend = HangingBackend
+    started = time.perf_counter()
+    process = notifier.notify("Timesheet submitted", urgent=True)
+    assert time.perf_counter() - started < 0.5
+    assert process.poll() is None
+    deadline = time.monotonic() + 10
+    while process.poll() is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert process.returncode is not None
+
+
+def test_backends(monkeypatch, caplog):
+    """Test backend selection, the log fallback and quoting of osascript messages"""
+    monkeypatch.delenv("DBUS_SESSION_BUS_ADDRESS", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(sys, "platform", "linux")
+    assert select_backend() is LogBackend
+    with pytest.raises(ValueError):
+        select_backend("dialog")
+    # Every backend the config accepts can be selected
+    assert Config.notification_backend_list == ["auto", *BACKENDS]
+
+    caplog.set_level("INFO")
+    assert Notifier("log").notify("Timesheet submitted") is None
+    assert "Timesheet submitted" in caplog.text
+
+    message = 'say "hi"; rm -rf ~'
+    script = OsascriptBackend.command(message, urgent=True, timeout=10)[2]
+    assert script.startswith(f"display dialog {applescript_string(message)}")
+    assert applescript_string('say "hi"') == '"say \\"hi\\""'
+    assert script.endswith("giving up after 10")
+
+
+def test_submitted_text():
+    """Test the notification text of runs with working days, only holidays or nothing left"""
+    holidays = [
+        (date(2022, 8, 9), {"holiday": 8}),
+        (date(2022, 12, 25), {"holiday": 8}),
+    ]
+    assert submitted_text(holidays[:1], "Today") == (
+        "Timesheet for today is successfully submitted."
+    )
+    assert submitted_text([(date(2022, 8, 8), {"live": 8})] + holidays) == (
+        "Timesheets from 2022-08-08 to 2022-12-25 are successfully submitted."
+    )
+    assert "already submitted" in submitted_text([])
@@ -0,0 +1,68 @@
+"""Unit tests for preparing the time entries of upcoming scheduled runs"""
+import os
+import uuid
+from datetime import date, datetime, timedelta
+import pytest
+import mock
+from tp_timesheet.clockify_timesheet import Clockify
+from tp_timesheet.config import Config
+from tp_timesheet.prepare import PreparedRuns
+from tp_timesheet.schedule import ScheduleForm
+
+# Import offline clockify fixture from adjacent test
+# pylint: disable=(unused-import)
+from .test_transaction import fixture_offline_clockify
+
+
+@pytest.fixture(name="prepared_path")
+def fixture_tmp_prepared_path():
+    """Path for a tmp prepared runs file, cleaned up after the test has run"""
+    prepared_path = Config.CONFIG_DIR.joinpath(f"tmp_pytest_{uuid.uuid4().hex}.json")
+    yield prepared_path
+    if os.path.exists(prepared_path):
+        os.remove(prepared_path)
+
+
+def test_next_run_dates():
+    """Test the scheduled run dates skip weekends and the run that already happened today"""
+    friday_after_run = datetime(2022, 8, 12, 10, 0)
+    assert ScheduleForm().next_run_dates(2, date_from=friday_after_run) == [
+        date(2022, 8, 15),
+        date(2022, 8, 16),
+    ]
+
+
+def test_prepared_runs_skip_lookups(clockify, prepared_path):
+    """Test a scheduled run reuses prepared metadata and entries without any lookups"""
+    tomorrow = date.today() + timedelta(days=1)
+    submissions = [(tomorrow, {"live": 4, "OOO": 4})]
+    PreparedRuns("key", "en_SG", path=prepared_path).prepare(clockify, submissions)
+    expected = clockify.build_time_entries(tomorrow, {"live": 4, "OOO": 4})
+
+    # Prepared data is not used for another api key
+    assert not PreparedRuns("other_key", "en_SG", path=prepared_path).load()
+
+    prepared = PreparedRuns("key", "en_SG", path=prepared_path)
+    assert prepared.load()
+    with mock.patch.object(Clockify, "_request", side_effect=AssertionError):
+        scheduled = Clockify("key", "en_SG", metadata=prepared.metadata)
+        prepared.apply(scheduled)
+        assert scheduled.build_time_entries(tomorrow, {"live": 4, "OOO": 4}) == expected
+        # Planning and submitting the prepared date does not look anything up either
+        with mock.patch.object(
+            Clockify, "get_project_id", side_effect=AssertionError
+        ), mock.patch.object(Clockify, "get_task_id", side_effect=AssertionError):
+            scheduled.submit_all(submissions, dry_run=True)
+
+
+def test_invalid_entries_are_not_prepared():
+    """Test validation of incomplete time entries"""
+    entry = {
+        "start": "2022-08-08T01:00:00Z",
+        "end": "2022-08-08T09:00:00Z",
+        "projectId": "project",
+        "taskId": None,
+        "tagIds": ["tag"],
+    }
+    with pytest.raises(ValueError):
+        PreparedRuns.validate([entry], {"live": 8})
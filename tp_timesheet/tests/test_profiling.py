@@ -0,0 +1,43 @@
+"""Unit tests for the --profile hooks"""
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+from tp_timesheet.profiling import Profiler
+
+
+def busy_work():
+    """Burn some cpu and hold some memory"""
+    held = [str(number) * 10 for number in range(20000)]
+    return sum(len(text) for text in held * 20), held
+
+
+def pool_work():
+    """Work only ever run by the threads of a pool"""
+    return busy_work()[0]
+
+
+def test_profile_files(tmp_path):
+    """Test the pstats of every thread, collapsed stacks and allocation summary are written"""
+    with Profiler(tmp_path.joinpath("profiles"), interval=0.001, top=5) as profiler:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(pool_work) for _ in range(2)]
+            _, held = busy_work()
+            assert all(future.result() for future in futures)
+
+    profiled = {
+        function: stat[1]
+        for (_, _, function), stat in pstats.Stats(
+            profiler.paths["pstats"]
+        ).stats.items()
+    }
+    # The calls of the pool threads are merged with the ones of the calling thread
+    assert profiled["pool_work"] == 2
+    assert profiled["busy_work"] == 3
+    with open(profiler.paths["collapsed"], "r", encoding="utf8") as collapsed_file:
+        stacks = collapsed_file.read().splitlines()
+    assert any("busy_work (test_profiling.py" in stack for stack in stacks)
+    assert all(stack.rsplit(" ", 1)[1].isdigit() for stack in stacks)
+    with open(profiler.paths["alloc"], "r", encoding="utf8") as alloc_file:
+        summary = alloc_file.read().splitlines()
+    assert summary[0].startswith("Peak traced memory")
+    assert len(summary) == 2 + 5
+    assert held
@@ -0,0 +1,31 @@
+"""Unit tests for the request budget shared between processes"""
+import os
+import threading
+import time
+import uuid
+from tp_timesheet.config import Config
+from tp_timesheet.ratelimit import SharedRateLimiter
+
+
+def test_budget_is_shared():
+    """Test that separate limiters on the same file draw from one budget"""
+    path = Config.CONFIG_DIR.joinpath(f"tmp_pytest_{uuid.uuid4().hex}.sqlite")
+    rate, requests_per_limiter = 50, 10
+    # Separate objects and connections, as if they were in separate processes
+    limiters = [SharedRateLimiter(rate, burst=1, path=path) for _ in range(3)]
+
+    def draw(limiter):
+        for _ in range(requests_per_limiter):
+            limiter.acquire()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=draw, args=(lim,)) for lim in limiters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    os.remove(path)
+
+    # 30 requests at 50 per second, the first one is free
+    assert elapsed >= (len(limiters) * requests_per_limiter - 1) / rate * 0.9
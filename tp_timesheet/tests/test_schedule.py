@@ -0,0 +1,64 @@
+"""Unit tests for the cron schedule, runs without touching the user's crontab"""
+from collections import Counter
+from datetime import date, datetime
+import pytest
+from crontab import CronTab
+from tp_timesheet.ledger import user_key
+from tp_timesheet.schedule import CRON_COMMENT, ScheduleForm
+
+LEGACY_JOB = (
+    "30 9 * * MON-FRI PATH='/usr/bin' /usr/bin/tp-timesheet --start today --count 1 "
+    "--notification --skip-submitted --prepare\n"
+)
+
+
+def test_jitter_spreads_users_over_the_window():
+    """Test every user gets the same time on every install, spread evenly over the window"""
+    schedules = [
+        ScheduleForm("09:00-10:00", user_key(f"api-key-{user}")) for user in range(600)
+    ]
+    again = ScheduleForm("09:00-10:00", user_key("api-key-0"))
+    assert (again.cron_hour, again.cron_minute, again.delay) == (
+        schedules[0].cron_hour,
+        schedules[0].cron_minute,
+        schedules[0].delay,
+    )
+    assert all(
+        (9, 0) <= (schedule.cron_hour, schedule.cron_minute) <= (9, 59)
+        for schedule in schedules
+    )
+    # 600 users over six 10 minute slots, about 100 each
+    slots = Counter(schedule.cron_minute // 10 for schedule in schedules)
+    assert len(slots) == 6
+    assert all(60 <= users <= 140 for users in slots.values())
+
+    exact = ScheduleForm("07:45-07:45", "anyone")
+    assert (exact.cron_hour, exact.cron_minute, exact.delay) == (7, 45, 0)
+    with pytest.raises(ValueError):
+        ScheduleForm("10:00-09:00", "anyone")
+    with pytest.raises(ValueError):
+        ScheduleForm("9am", "anyone")
+
+
+def test_install_replaces_its_job():
+    """Test scheduling again replaces the job, including one scheduled by older versions"""
+    cron = CronTab(tab=f"0 8 * * * backup.sh\n{LEGACY_JOB}")
+    scheduler = ScheduleForm("09:00-10:00", "user")
+    scheduler.install(cron, "/usr/bin/tp-timesheet")
+    scheduler.install(cron, "/usr/bin/tp-timesheet")
+
+    jobs = list(cron)
+    assert len(jobs) == 2
+    assert jobs[0].command == "backup.sh"
+    assert jobs[1].comment == CRON_COMMENT
+    assert str(jobs[1].minute) == str(scheduler.cron_minute)
+    assert jobs[1].command.startswith(f"sleep {scheduler.delay} && ")
+
+
+def test_next_run_dates_follow_the_jitter():
+    """Test the upcoming run dates use the user's own run time"""
+    early = ScheduleForm("09:00-09:00", "user")
+    late = ScheduleForm("11:00-11:00", "user")
+    monday = datetime(2022, 8, 15, 10, 0)
+    assert early.next_run_dates(1, date_from=monday) == [date(2022, 8, 16)]
+    assert late.next_run_dates(1, date_from=monday) == [date(2022, 8, 15)]
@@ -0,0 +1,187 @@
+"""Unit tests for serve mode, submissions are sent to the fake clockify api"""
+import datetime
+import json
+import os
+import stat
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from tp_timesheet.clockify_timesheet import Clockify
+from tp_timesheet.serve import Batcher, SubmissionServer, load_token
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+@pytest.fixture(name="server")
+def fixture_submission_server():
+    """Serve mode on a free port, backed by the fake api"""
+    api = FakeClockifyAPI(latency=0.01, locales=["en_SG"])
+    batcher = Batcher(
+        lambda api_key, locale: SimulatedClockify(api_key, locale, session=api),
+        window=0.2,
+    )
+    server = SubmissionServer(
+        batcher,
+        "serverkey",
+        "en_SG",
+        "servertoken",
+        port=0,
+        task_names=list(Clockify.task_project_dict),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, api
+    server.shutdown()
+    server.server_close()
+
+
+def call(server, method, path, body=None, token="servertoken"):
+    """Send a request to the server, returns (status code, json body)"""
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{server.server_port}{path}",
+        data=None if body is None else json.dumps(body).encode("utf8"),
+        headers={"Authorization": f"Bearer {token}"},
+        method=method,
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_concurrent_submissions_are_batched(server):
+    """Test concurrent callers are acknowledged straight away and submitted in one batch"""
+    server, api = server
+    bodies = [
+        {"start": "2022-08-08", "count": 1, "tasks": {"live": 8}},
+        {"start": "2022-08-09", "count": 2, "tasks": {"live": 4, "OOO": 4}},
+        {"start": "2022-08-08", "count": 1, "tasks": {"training": 8}},
+    ]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        replies = list(
+            executor.map(
+                lambda body: call(server, "POST", "/submissions", body), bodies
+            )
+        )
+    assert [status for status, _ in replies] == [202, 202, 202]
+    assert replies[1][1]["dates"] == {"2022-08-09": "queued", "2022-08-10": "queued"}
+
+    deadline = time.monotonic() + 10
+    statuses = []
+    while time.monotonic() < deadline:
+        statuses = [
+            call(server, "GET", f"/submissions/{body['id']}")[1] for _, body in replies
+        ]
+        if all(status["status"] != "queued" for status in statuses):
+            break
+        time.sleep(0.05)
+    assert [status["status"] for status in statuses] == ["submitted"] * 3
+    assert server.batcher.batches == 1
+    # 2022-08-08 was requested twice within the window, it is only submitted once
+    requests = [(method, endpoint) for method, endpoint, _, _ in api.log]
+    # training on the 8th, a holiday on the 9th, live and OOO on the 10th
+    assert requests.count(("POST", "time_entries")) == 1 + 1 + 2
+    # and the entries of the three dates are fetched at once
+    assert requests.count(("GET", "time_entries")) == 1
+
+
+def test_invalid_submission(server):
+    """Test invalid submissions are rejected without being queued"""
+    server, _ = server
+    status, body = call(
+        server, "POST", "/submissions", {"start": "2022-08-08", "tasks": {"live": 4}}
+    )
+    assert status == 400
+    assert "add up to 8" in body["message"]
+    status, body = call(
+        server, "POST", "/submissions", {"start": "2022-08-08", "tasks": {"nap": 8}}
+    )
+    assert status == 400
+    assert call(server, "GET", "/submissions/unknown")[0] == 404
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        ["2022-08-08"],
+        "2022-08-08",
+        {"start": "2022-08-08", "tasks": ["live"]},
+        {"start": "2022-08-08", "tasks": "live"},
+        {"start": "2022-08-08", "tasks": {}},
+        {"start": "2022-08-08", "tasks": {"live": "8"}},
+        {"start": "2022-08-08", "tasks": {"live": 8.0}},
+        {"start": "2022-08-08", "tasks": {"live": 12, "OOO": -4}},
+        {"start": "2022-08-08", "tasks": {"live": True, "OOO": 7}},
+        {"start": "2022-08-08", "count": 0, "tasks": {"live": 8}},
+        {"start": "2022-08-08", "count": 100000000, "tasks": {"live": 8}},
+        {"start": "2022-08-08", "count": "5", "tasks": {"live": 8}},
+        {"start": "08/08/2022", "tasks": {"live": 8}},
+        {"start": 20220808, "tasks": {"live": 8}},
+        {"tasks": {"live": 8}},
+        {"start": "2022-08-08", "tasks": {"live": 8}, "locale": "tlh_KL"},
+        {"start": "2022-08-08", "tasks": {"live": 8}, "api_key": ["key"]},
+    ],
+)
+def test_malformed_submission(server, body):
+    """Test malformed submissions are answered with a 400 and never queued"""
+    server, _ = server
+    status, reply = call(server, "POST", "/submissions", body)
+    assert status == 400, reply
+    assert reply["message"]
+    assert not server.batcher.statuses
+
+
+def test_start_date_sanity_check(server):
+    """Test start dates beyond the sanity check range are rejected, like the cli does"""
+    server, _ = server
+    server.sanity_check_range = 7
+    today = datetime.date.today()
+    far = today + datetime.timedelta(days=30)
+    status, reply = call(
+        server, "POST", "/submissions", {"start": far.isoformat(), "tasks": {"live": 8}}
+    )
+    assert status == 400
+    assert "day window" in reply["message"]
+    status, _ = call(
+        server,
+        "POST",
+        "/submissions",
+        {"start": today.isoformat(), "tasks": {"live": 8}},
+    )
+    assert status == 202
+
+
+def test_requests_need_the_token(server, tmp_path):
+    """Test only callers that can read the owner's token may submit"""
+    server, api = server
+    body = {"start": "2022-08-08", "tasks": {"live": 8}}
+    assert call(server, "POST", "/submissions", body, token="guess")[0] == 401
+    assert call(server, "GET", "/submissions/unknown", token="")[0] == 401
+    assert not server.batcher.statuses and not api.log
+
+    path = tmp_path.joinpath("serve.token")
+    token = load_token(path)
+    assert load_token(path) == token
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_finished_statuses_are_evicted():
+    """Test the statuses of finished submissions are forgotten after their ttl"""
+    api = FakeClockifyAPI(latency=0, locales=["en_SG"])
+    batcher = Batcher(
+        lambda api_key, locale: SimulatedClockify(api_key, locale, session=api),
+        window=0,
+        status_ttl=0.1,
+    )
+    submission_id = batcher.submit(
+        "evicted", "en_SG", [(datetime.date(2022, 8, 8), {"live": 8})]
+    )
+    deadline = time.monotonic() + 10
+    while batcher.status(submission_id)["status"] == "queued":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert batcher.status(submission_id) is None
+    assert not batcher.statuses
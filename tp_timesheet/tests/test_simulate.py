@@ -0,0 +1,122 @@
+"""Unit tests for the fake clockify api and the capacity planning simulation"""
+import json
+from datetime import date
+from workalendar.asia import Singapore
+from tp_timesheet.clockify_timesheet import Clockify
+from tp_timesheet.simulate import (
+    FakeClockifyAPI,
+    SimulatedClockify,
+    simulate,
+    summarize,
+)
+
+
+def test_simulated_request_counts():
+    """Test every user runs the whole pipeline, including the lookups, against the fake api"""
+    report = simulate(
+        team_size=3,
+        start_date=date(2022, 8, 8),
+        count=3,  # two working days and a holiday
+        task_and_hours={"live": 4, "OOO": 4},
+        cal=Singapore(),
+        workers=2,
+        latency=0.01,
+        time_scale=0.1,
+    )
+    assert report["dates_per_user"] == 3
+    by_endpoint = report["requests_by_endpoint"]
+    assert by_endpoint["GET user"] == 3
+    assert by_endpoint["GET tags"] == 3
+    # the entries of the three dates are fetched at once
+    assert by_endpoint["GET time_entries"] == 3 * 1
+    assert by_endpoint["DELETE time_entries"] == 3 * 3
+    assert by_endpoint["POST time_entries"] == 3 * (2 + 2 + 1)
+    assert 1 <= report["peak_concurrency"] <= 3 * 2
+    assert report["estimated_wall_time"] > 0
+
+
+def test_summarize_concurrency():
+    """Test concurrency percentiles and peak rate of a hand written request log"""
+    request_log = [
+        ("GET", "user", 0.0, 1.0),
+        ("GET", "tags", 0.5, 1.0),
+        ("POST", "time_entries", 1.0, 4.0),
+    ]
+    report = summarize(request_log, wall_time=4.0, team_size=1, dates=1)
+    assert report["requests"] == 3
+    assert report["peak_concurrency"] == 2
+    assert report["concurrency_profile"] == {"p50": 1, "p90": 2, "p99": 2, "p100": 2}
+    assert report["peak_requests_per_second"] == 2
+
+
+def test_metadata_resolved_lazily():
+    """Test creating Clockify objects is free and the workspace metadata is requested once"""
+    api = FakeClockifyAPI(latency=0, locales=["en_SG"])
+    clockify = Clockify("lazy-metadata", locale="en_SG", session=api)
+    assert not api.log
+    metadata = clockify.metadata
+    assert [(method, endpoint) for method, endpoint, _, _ in api.log] == [
+        ("GET", "user"),
+        ("GET", "tags"),
+    ]
+    again = Clockify("lazy-metadata", locale="en_SG", session=api)
+    assert again.workspace_id == metadata["workspace_id"]
+    assert len(api.log) == 2
+
+
+def test_filtered_lookups_in_large_workspace():
+    """Test names are looked up with the api's name filter and all pages are walked"""
+    tags = [f"tag{number}" for number in range(120)]
+    api = FakeClockifyAPI(latency=0, locales=tags + ["en_SG"])
+    clockify = SimulatedClockify("large-workspace", locale="en_SG", session=api)
+    assert clockify.locale_id == api.tags[-1]["id"]
+    assert [endpoint for _, endpoint, _, _ in api.log] == ["user", "tags"]
+
+    # pylint: disable=protected-access
+    pages = len(api.log)
+    tags = list(clockify._paginate(f"/workspaces/{clockify.workspace_id}/tags"))
+    assert len(tags) == 121
+    assert len(api.log) - pages == 3
+
+
+def test_time_entries_of_a_range_fetched_at_once():
+    """Test a range of dates is snapshotted with one compressed request"""
+    api = FakeClockifyAPI(latency=0, existing_entries=2, locales=["en_SG"])
+    clockify = SimulatedClockify("range", locale="en_SG", session=api)
+    dates = [date(2022, 8, 1), date(2022, 8, 2), date(2022, 8, 5)]
+    clockify.submit_all([(day, {"live": 8}) for day in dates])
+
+    requests = [(method, endpoint) for method, endpoint, _, _ in api.log]
+    assert requests.count(("GET", "time_entries")) == 1
+    assert requests.count(("DELETE", "time_entries")) == 2 * len(dates)
+    assert not clockify.prefetched_entries
+    for day in dates:
+        assert [entry["taskId"] for entry in clockify.get_time_entries(day)] == [
+            clockify.get_task_id(clockify.get_project_id("live"), "live")
+        ]
+    # Responses are gzip compressed and their compressed size is counted
+    received = clockify.bytes_received["time_entries"]
+    entries = clockify.get_time_entries_between(dates[0], dates[-1])
+    assert (
+        0
+        < clockify.bytes_received["time_entries"] - received
+        < len(json.dumps(entries))
+    )
+
+
+def test_stale_prefetched_entries_fetched_again():
+    """Test a date submitted long after the prefetch replaces the entries it has by then"""
+    api = FakeClockifyAPI(latency=0, existing_entries=1, locales=["en_SG"])
+    clockify = SimulatedClockify("stale", locale="en_SG", session=api)
+    day = date(2022, 8, 1)
+    clockify.prefetch_time_entries([day, date(2022, 8, 2)])
+    # An overlapping run replaces the day after the prefetch
+    SimulatedClockify("stale", locale="en_SG", session=api).submit_clockify(
+        day, {"OOO": 8}
+    )
+
+    clockify.prefetch_max_age = 0
+    clockify.submit_clockify(day, {"live": 8})
+    assert [entry["taskId"] for entry in clockify.get_time_entries(day)] == [
+        clockify.get_task_id(clockify.get_project_id("live"), "live")
+    ]
@@ -0,0 +1,52 @@
+"""Unit tests for the span tracing of a run, runs without the clockify api"""
+import json
+from datetime import date
+from tp_timesheet import tracing
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+def test_spans_of_a_run(tmp_path):
+    """Test every date is a span of its worker thread, with its api requests nested inside"""
+    api = FakeClockifyAPI(latency=0, existing_entries=1, locales=["en_SG"])
+    clockify = SimulatedClockify("traced", locale="en_SG", session=api)
+    dates = [date(2022, 8, 1), date(2022, 8, 2)]
+    trace_path = tmp_path.joinpath("run.trace.json")
+    tracing.start()
+    try:
+        clockify.submit_all([(day, {"live": 4, "OOO": 4}) for day in dates], workers=2)
+    finally:
+        tracing.stop(trace_path)
+
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] == "X"]
+    names = [event["name"] for event in spans]
+    assert names.count("submit date") == len(dates)
+    assert names.count("POST time_entries") == 2 * len(dates)
+    assert names.count("DELETE time_entries") == len(dates)
+    assert {"resolve workspace", "prefetch time entries", "submit dates"} <= set(names)
+    assert all(
+        event["args"]["status"] == 201
+        for event in spans
+        if event["name"] == "POST time_entries"
+    )
+
+    def within(inner, outer):
+        return (
+            inner["tid"] == outer["tid"]
+            and outer["ts"] <= inner["ts"]
+            and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"] + 1
+        )
+
+    submitted = [event for event in spans if event["name"] == "submit date"]
+    for event in spans:
+        if event["name"] in ("POST time_entries", "DELETE time_entries"):
+            assert any(within(event, parent) for parent in submitted)
+    threads = {event["tid"] for event in events if event["name"] == "thread_name"}
+    assert {event["tid"] for event in spans} <= threads
+
+
+def test_disabled_spans_do_nothing():
+    """Test spans are a shared no-op while tracing is off"""
+    assert tracing.span("anything", date=date(2022, 8, 1)) is tracing.span("other")
+    with tracing.span("anything") as span_args:
+        assert span_args is None
@@ -0,0 +1,180 @@
+"""Unit tests for the per-date transactional submission, runs without the clockify api"""
+import datetime
+import json
+import itertools
+import pytest
+import mock
+import requests
+from tp_timesheet.breaker import CircuitBreaker, CircuitOpenError
+from tp_timesheet.clockify_timesheet import Clockify
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+
+
+class FakeResponse:  # pylint: disable=too-few-public-methods
+    """Minimal stand-in for `requests.Response`"""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self.content = self.text.encode("utf8")
+        self.headers = {}
+
+    def raise_for_status(self):
+        """Raise like requests does on 4xx/5xx"""
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+class FakeTimeEntries:
+    """In-memory time entries endpoint, POSTs fail once `fail_on_post` is reached"""
+
+    def __init__(self, fail_on_post=None):
+        self.entries = {}
+        self.ids = itertools.count()
+        self.posts = 0
+        self.fail_on_post = fail_on_post
+
+    def request(self, method, url, **kwargs):
+        """Dispatch like `requests.Session.request`"""
+        return getattr(self, method.lower())(url, **kwargs)
+
+    def get(self, url, params=None, **_):  # pylint: disable=unused-argument
+        """List the time entries starting within the requested interval"""
+        return FakeResponse(
+            200,
+            [
+                entry
+                for entry in self.entries.values()
+                if params["start"] <= entry["timeInterval"]["start"] <= params["end"]
+            ],
+        )
+
+    def post(
+        self, url, json=None, **_
+    ):  # pylint: disable=unused-argument,redefined-outer-name
+        """Create a time entry"""
+        self.posts += 1
+        if self.posts == self.fail_on_post:
+            return FakeResponse(503, {"message": "unavailable"})
+        entry_id = f"entry{next(self.ids)}"
+        self.entries[entry_id] = {
+            "id": entry_id,
+            "projectId": json["projectId"],
+            "taskId": json["taskId"],
+            "tagIds": json["tagIds"],
+            "timeInterval": {"start": json["start"], "end": json["end"]},
+        }
+        return FakeResponse(201, self.entries[entry_id])
+
+    def delete(self, url, **_):
+        """Delete a time entry"""
+        self.entries.pop(url.rsplit("/", 1)[-1])
+        return FakeResponse(204, {})
+
+    def tasks(self):
+        """Sorted task ids of the stored entries"""
+        return sorted(entry["taskId"] for entry in self.entries.values())
+
+
+@pytest.fixture(name="clockify")
+def fixture_offline_clockify():
+    """Clockify object with its workspace metadata and ids resolved without the api"""
+    metadata = {
+        "workspace_id": "ws",
+        "user_id": "user",
+        "timezone": "Asia/Singapore",
+        "start_time": "09:00",
+        "locale_id": "tag",
+    }
+    clockify = Clockify(api_key="key", locale="en_SG", metadata=metadata)
+    with mock.patch.object(
+        Clockify, "get_project_id", lambda _, task: "project"
+    ), mock.patch.object(Clockify, "get_task_id", lambda _, project, task: task):
+        yield clockify
+
+
+def test_failed_submission_restores_day(clockify):
+    """Test that a failing second POST of a split day restores the previous entries"""
+    fake_api = FakeTimeEntries()
+    test_date = datetime.date(2022, 8, 8)
+    clockify.session = fake_api
+    clockify.submit_clockify(test_date, {"live": 8})
+    assert fake_api.tasks() == ["live"]
+
+    fake_api.fail_on_post = fake_api.posts + 2
+    with pytest.raises(requests.HTTPError):
+        clockify.submit_clockify(test_date, {"training": 4, "OOO": 4})
+    assert fake_api.tasks() == ["live"]
+
+    clockify.submit_clockify(test_date, {"training": 4, "OOO": 4})
+    assert fake_api.tasks() == ["OOO", "training"]
+
+
+def test_rollback_while_breaker_open(clockify, tmp_path):
+    """Test a breaker opened by a failed write still lets the rollback restore the day"""
+    fake_api = FakeTimeEntries()
+    test_date = datetime.date(2022, 8, 8)
+    clockify.session = fake_api
+    clockify.submit_clockify(test_date, {"live": 8})
+
+    clockify.circuit_breaker = CircuitBreaker(
+        failures=1, path=tmp_path.joinpath("breaker.sqlite")
+    )
+    # The 503 of the second POST opens the breaker before the rollback is sent
+    fake_api.fail_on_post = fake_api.posts + 2
+    with pytest.raises(requests.HTTPError):
+        clockify.submit_clockify(test_date, {"training": 4, "OOO": 4})
+    assert fake_api.tasks() == ["live"]
+
+    # While open, no new transaction is started
+    clockify.circuit_breaker.record_failure()
+    posts = fake_api.posts
+    with pytest.raises(CircuitOpenError):
+        clockify.submit_clockify(test_date, {"training": 4, "OOO": 4})
+    assert (fake_api.posts, fake_api.tasks()) == (posts, ["live"])
+
+
+def test_concurrent_submission(clockify):
+    """Test that concurrently submitted dates each end up with exactly their own entries"""
+    fake_api = FakeTimeEntries()
+    dates = [datetime.date(2022, 8, day) for day in range(1, 6)]
+    submitted = []
+    clockify.session = fake_api
+    clockify.submit_all([(date, {"live": 8}) for date in dates], workers=3)
+    clockify.submit_all(
+        [(date, {"live": 4, "OOO": 4}) for date in dates],
+        workers=3,
+        on_submitted=lambda date, *_: submitted.append(date),
+    )
+    assert sorted(submitted) == dates
+    for date in dates:
+        tasks = [entry["taskId"] for entry in clockify.get_time_entries(date)]
+        assert sorted(tasks) == ["OOO", "live"]
+
+
+def test_invalid_run_has_no_side_effects():
+    """Test unknown tasks fail the whole run before the first write, not part way through"""
+    api = FakeClockifyAPI(latency=0, existing_entries=1, locales=["en_SG"])
+    clockify = SimulatedClockify("preflight", locale="en_SG", session=api)
+    first, second = datetime.date(2022, 8, 1), datetime.date(2022, 8, 2)
+
+    with pytest.raises(ValueError, match="livee"):
+        clockify.submit_all([(first, {"live": 8}), (second, {"livee": 8})])
+    assert not api.log
+
+    # Known to the client but missing from the workspace
+    clockify.task_project_dict = {
+        **Clockify.task_project_dict,
+        "idle": ("Idle", "NLx"),
+        "bench": ("Bench", "Internal"),
+    }
+    with pytest.raises(ValueError, match='"Internal".*"idle"'):
+        clockify.submit_all(
+            [(first, {"live": 8}), (second, {"bench": 4, "idle": 4})], workers=2
+        )
+    assert {endpoint for _, endpoint, _, _ in api.log} == {
+        "user",
+        "tags",
+        "projects",
+        "tasks",
+    }
@@ -0,0 +1,65 @@
+"""Unit tests for the record/replay transports, a recording is replayed without any api"""
+import datetime
+import pytest
+from tp_timesheet.simulate import FakeClockifyAPI, SimulatedClockify
+from tp_timesheet.transport import RecordingTransport, ReplayTransport
+
+API_KEY = "RecordedApiKey1234"
+TEST_DATE = datetime.date(2030, 1, 7)
+
+
+def submission_scenario(clockify):
+    """Look up the ids, then submit, resubmit and remove a day, like the live api tests"""
+    ids = [
+        clockify.get_task_id(clockify.get_project_id(task), task)
+        for task in ["live", "training", "OOO", "holiday"]
+    ]
+    entries = []
+    clockify.delete_time_entry(TEST_DATE)
+    for tasks in [{"live": 4}, {"OOO": 4}]:
+        clockify.submit_clockify(TEST_DATE, tasks)
+        entries.append(clockify.get_time_entries(TEST_DATE))
+    clockify.delete_time_entry(TEST_DATE)
+    entries.append(clockify.get_time_entries(TEST_DATE))
+    return clockify.metadata, ids, entries
+
+
+@pytest.fixture(name="cassette")
+def fixture_recorded_cassette(tmp_path):
+    """Cassette of the scenario recorded against the fake api, with the recorded results"""
+    path = tmp_path.joinpath("cassette.json")
+    transport = RecordingTransport(path, session=FakeClockifyAPI(latency=0.01))
+    clockify = SimulatedClockify(API_KEY, locale="en_SG", session=transport)
+    return path, submission_scenario(clockify)
+
+
+def test_replay_matches_recording(cassette):
+    """Test a replayed run sees exactly the responses of the recorded run"""
+    path, recorded = cassette
+    with open(path, "r", encoding="utf8") as cassette_file:
+        assert API_KEY not in cassette_file.read()
+
+    clockify = SimulatedClockify(API_KEY, locale="en_SG", session=ReplayTransport(path))
+    metadata, ids, entries = submission_scenario(clockify)
+    assert (metadata, ids, entries) == recorded
+    assert [len(day) for day in entries] == [1, 1, 0]
+    assert entries[0][0]["taskId"] == ids[0]
+    assert entries[1][0]["taskId"] == ids[2]
+    assert entries[0][0]["tagIds"] == [metadata["locale_id"]]
+
+
+def test_replay_unknown_request(cassette):
+    """Test a request that was never recorded fails instead of reaching the api"""
+    path, _ = cassette
+    clockify = SimulatedClockify(API_KEY, locale="en_SG", session=ReplayTransport(path))
+    with pytest.raises(LookupError, match="No recorded response"):
+        clockify.get_time_entries(datetime.date(2030, 2, 1))
+
+
+def test_replay_missing_lookup_is_not_invalid_run(tmp_path):
+    """Test a lookup missing from the cassette fails the plan as missing, not as an invalid task"""
+    path = tmp_path.joinpath("empty.json")
+    path.write_text("[]")
+    clockify = SimulatedClockify(API_KEY, locale="en_SG", session=ReplayTransport(path))
+    with pytest.raises(LookupError, match="No recorded response for GET"):
+        clockify.plan([(TEST_DATE, {"live": 8})])
@@ -0,0 +1,97 @@
+""" Nested spans of a run, exported as a Chrome trace event file with --trace """
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Entered instead of a span while tracing is off, costs one function call
+_DISABLED = nullcontext()
+_tracer = None  # pylint: disable=invalid-name
+
+
+class Tracer:
+    """Records spans of every thread as Chrome trace "complete" events
+
+    Spans of a thread nest by their start and end times, trace viewers (chrome://tracing,
+    ui.perfetto.dev, speedscope) draw one lane per thread so the work of the worker threads of a
+    multi-date run can be followed next to the main thread.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._epoch = time.perf_counter()
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    @contextmanager
+    def span(self, name, **args):
+        """Record the time spent in the block, `args` are shown with the span
+
+        Yields:
+            args (dict): more arguments can be added to it within the block
+        """
+        thread = threading.current_thread()
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            ended = time.perf_counter()
+            with self._lock:
+                self._threads[thread.ident] = thread.name
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": round((started - self._epoch) * 1e6, 1),
+                        "dur": round((ended - started) * 1e6, 1),
+                        "pid": os.getpid(),
+                        "tid": thread.ident,
+                        "args": args,
+                    }
+                )
+
+    def export(self, path):
+        """Write the spans to a trace event file, atomically"""
+        with self._lock:
+            names = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": ident,
+                    "args": {"name": name},
+                }
+                for ident, name in self._threads.items()
+            ]
+            trace = {"traceEvents": names + self.events, "displayTimeUnit": "ms"}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as trace_file:
+            json.dump(trace, trace_file, default=str)
+        os.replace(tmp_path, path)
+
+
+def span(name, **args):
+    """Span of the active tracer (see `start`), does nothing while tracing is off"""
+    if _tracer is None:
+        return _DISABLED
+    return _tracer.span(name, **args)
+
+
+def start():
+    """Start tracing the spans of every thread
+
+    Returns:
+        tracer (Tracer): the active tracer
+    """
+    global _tracer  # pylint: disable=global-statement
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop(path):
+    """Stop tracing and export the spans recorded since `start` to `path`"""
+    global _tracer  # pylint: disable=global-statement
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.export(path)
@@ -0,0 +1,121 @@
+""" Record/replay transports for the Clockify client, to reproduce runs without the live api """
+import http
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+import requests
+from requests.structures import CaseInsensitiveDict
+
+REDACTED = "REDACTED"
+# Response headers kept in cassettes, everything else is dropped to keep them compact
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def build_response(status_code, content, url, headers=None):
+    """Build a `requests.Response` from its raw parts
+
+    Args:
+        content (bytes): response body
+    """
+    # pylint: disable=protected-access
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = http.HTTPStatus(status_code).phrase
+    response._content = content
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.url = url
+    response.encoding = "utf-8"
+    return response
+
+
+def request_key(method, url, params=None, body=None, api_key=None):
+    """Identify a request, the api key is redacted so recordings can be shared"""
+    key = json.dumps([method, url, params or {}, body], sort_keys=True)
+    return key.replace(api_key, REDACTED) if api_key else key
+
+
+class RecordingTransport:  # pylint: disable=too-few-public-methods
+    """Session compatible transport that sends requests and records them to a cassette
+
+    Every interaction is stored with its latency, the cassette is rewritten after every request
+    so a run that crashes still leaves a usable recording. Request headers are not recorded and
+    the api key is redacted from urls and bodies.
+    """
+
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session if session is not None else requests.Session()
+        self.interactions = []
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, json=None, headers=None, **kwargs):
+        """Send a request like `requests.Session.request` and record it"""
+        # pylint: disable=redefined-outer-name,too-many-arguments
+        started = time.perf_counter()
+        response = self.session.request(
+            method, url, params=params, json=json, headers=headers, **kwargs
+        )
+        latency = time.perf_counter() - started
+        api_key = (headers or {}).get("X-Api-Key")
+        body = response.content.decode("utf8")
+        with self._lock:
+            self.interactions.append(
+                {
+                    "request": request_key(method, url, params, json, api_key),
+                    "status": response.status_code,
+                    "headers": {
+                        name: response.headers[name]
+                        for name in RECORDED_HEADERS
+                        if name in response.headers
+                    },
+                    "body": body.replace(api_key, REDACTED) if api_key else body,
+                    "latency": round(latency, 4),
+                }
+            )
+            self._write()
+        return response
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as cassette_file:
+            json.dump(self.interactions, cassette_file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+class ReplayTransport:  # pylint: disable=too-few-public-methods
+    """Session compatible transport that serves the responses of a cassette
+
+    Identical requests are answered in the order they were recorded, once they are used up the
+    last one is repeated. Responses are served at full speed, or after their recorded latency
+    with `latency=True`.
+    """
+
+    def __init__(self, path, latency=False):
+        self.latency = latency
+        self.interactions = defaultdict(deque)
+        with open(path, "r", encoding="utf8") as cassette_file:
+            for interaction in json.load(cassette_file):
+                self.interactions[interaction["request"]].append(interaction)
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, json=None, headers=None, **_):
+        """Answer a request like `requests.Session.request` with its recorded response"""
+        # pylint: disable=redefined-outer-name,too-many-arguments
+        api_key = (headers or {}).get("X-Api-Key")
+        key = request_key(method, url, params, json, api_key)
+        with self._lock:
+            recorded = self.interactions.get(key)
+            if not recorded:
+                # Not a ValueError, which would read as an invalid task, project or tag
+                raise LookupError(f"No recorded response for {method} {url} {params}")
+            interaction = recorded.popleft() if len(recorded) > 1 else recorded[0]
+        if self.latency:
+            time.sleep(interaction["latency"])
+        body = interaction["body"]
+        if api_key:
+            body = body.replace(REDACTED, api_key)
+        return build_response(
+            interaction["status"], body.encode("utf8"), url, interaction["headers"]
+        )